@@ -32,3 +32,54 @@ CREATE TABLE student_subject (
     FOREIGN KEY (student_id) REFERENCES login(uid),
     FOREIGN KEY (subject_id) REFERENCES subject(subject_id)
 );
+
+CREATE UNIQUE INDEX IF NOT EXISTS login_email_key ON login (email);
+
+ALTER TABLE student_subject
+    ADD COLUMN IF NOT EXISTS attended NUMERIC(8,2) NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS sessions INT NOT NULL DEFAULT 0;
+
+-- attended is fractional so a percentage entered by hand is kept exactly
+ALTER TABLE student_subject ALTER COLUMN attended TYPE NUMERIC(8,2);
+
+-- Percentages recorded before the counters existed count as one session at that rate,
+-- so the first marked session averages with them instead of replacing them
+UPDATE student_subject
+SET attended = ROUND(attendance / 100.0, 2), sessions = 1
+WHERE sessions = 0 AND attendance > 0;
+
+DROP FUNCTION IF EXISTS mark_attendance(INT, UUID[], UUID[]);
+
+CREATE OR REPLACE FUNCTION mark_attendance(p_subject_id INT, p_present UUID[], p_absent UUID[])
+RETURNS TABLE (student_id UUID, subject_id INT, attendance DECIMAL(5,2), attended NUMERIC(8,2), sessions INT)
+LANGUAGE sql AS $$
+    INSERT INTO student_subject AS ss (student_id, subject_id, attended, sessions, attendance)
+    SELECT s.student_id, p_subject_id, s.present::INT, 1, CASE WHEN s.present THEN 100.00 ELSE 0.00 END
+    FROM (
+        SELECT unnest(p_present) AS student_id, TRUE AS present
+        UNION ALL
+        SELECT unnest(p_absent), FALSE
+    ) s
+    ON CONFLICT (student_id, subject_id) DO UPDATE
+    SET attended = ss.attended + EXCLUDED.attended,
+        sessions = ss.sessions + 1,
+        attendance = ROUND(100.0 * (ss.attended + EXCLUDED.attended) / (ss.sessions + 1), 2)
+    RETURNING ss.student_id, ss.subject_id, ss.attendance, ss.attended, ss.sessions;
+$$;
+
+-- Manual edits: set the percentage and rescale attended to match, over p_sessions
+-- sessions if given, else over the sessions already counted (at least one)
+CREATE OR REPLACE FUNCTION set_attendance(p_student_id UUID, p_subject_id INT, p_attendance DECIMAL(5,2), p_sessions INT DEFAULT NULL)
+RETURNS TABLE (student_id UUID, subject_id INT, attendance DECIMAL(5,2), attended NUMERIC(8,2), sessions INT)
+LANGUAGE sql AS $$
+    UPDATE student_subject AS ss
+    SET sessions = COALESCE(p_sessions, GREATEST(ss.sessions, 1)),
+        attended = ROUND(p_attendance / 100.0 * COALESCE(p_sessions, GREATEST(ss.sessions, 1)), 2),
+        attendance = p_attendance
+    WHERE ss.student_id = p_student_id AND ss.subject_id = p_subject_id
+    RETURNING ss.student_id, ss.subject_id, ss.attendance, ss.attended, ss.sessions;
+$$;
+
+ALTER TABLE quiz
+    ADD COLUMN IF NOT EXISTS quiz_blob TEXT,
+    ADD COLUMN IF NOT EXISTS content_hash CHAR(64);
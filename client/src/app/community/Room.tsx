@@ -12,10 +12,26 @@ export function Room({ children }: { children: ReactNode }) {
   // The Liveblocks client will call this authEndpoint to mint a short-lived
   // Liveblocks token. We run a FastAPI endpoint at /liveblocks/auth which
   // proxies the server-side call to Liveblocks using the secret key.
-  const authEndpoint =
+  const authUrl =
     process.env.NEXT_PUBLIC_LIVEBLOCKS_AUTH_ENDPOINT ||
     "http://localhost:8000/liveblocks/auth";
 
+  // Send a per-browser id so reconnects and extra tabs reuse one cached token
+  // instead of minting a new anonymous identity each time.
+  const authEndpoint = async (room?: string) => {
+    let anonymousId = localStorage.getItem("liveblocksAnonymousId");
+    if (!anonymousId) {
+      anonymousId = crypto.randomUUID();
+      localStorage.setItem("liveblocksAnonymousId", anonymousId);
+    }
+    const response = await fetch(authUrl, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ room, anonymous_id: anonymousId }),
+    });
+    return await response.json();
+  };
+
   return (
     <LiveblocksProvider authEndpoint={authEndpoint}>
       <RoomProvider id="my-room">
@@ -0,0 +1,132 @@
+import hashlib
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+import features
+
+# Keywords picked from a job description when the caller doesn't list them
+ATS_MAX_KEYWORDS = int(os.getenv("ATS_MAX_KEYWORDS", "25"))
+# Share of the final score from TF-IDF similarity; the rest is keyword coverage
+ATS_SIMILARITY_WEIGHT = float(os.getenv("ATS_SIMILARITY_WEIGHT", "0.6"))
+
+# numpy is imported on first use, not at startup
+ats = features.module_feature("ats", "numpy")
+
+# Keeps skills like c++, c#, node.js and ci/cd in one piece
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9+#]*(?:[./-][a-z0-9+#]+)*")
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below between
+both but by can could did do does doing down during each etc few for from further had has have having he her
+here hers him his how i if in into is it its just me more most my no nor not now of off on once only or other
+our ours out over own same she should so some such than that the their theirs them then there these they this
+those through to too under until up us very via was we were what when where which while who whom why will with
+within would you your yours
+ability able across candidate candidates including looking must plus preferred required requirements role
+strong good excellent work working well
+""".split())
+
+
+def terms(text: str) -> List[str]:
+    """Unigrams and adjacent bigrams of ``text``, lowercased, without stopwords or bare numbers."""
+    words = [w for w in _TOKEN.findall(text.lower()) if w not in STOPWORDS and not w.isdigit()]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def _normalize_keyword(keyword: str) -> str:
+    return " ".join(_TOKEN.findall(keyword.lower()))
+
+
+def _auto_keywords(counts: Counter, limit: int) -> List[str]:
+    """Most frequent JD terms: repeated bigrams first, then unigrams, ties in order of appearance."""
+    order = {term: i for i, term in enumerate(counts)}
+    bigrams = [t for t, n in counts.items() if " " in t and n >= 2]
+    unigrams = [t for t in counts if " " not in t]
+    ranked = sorted(bigrams, key=lambda t: (-counts[t], order[t])) + sorted(unigrams, key=lambda t: (-counts[t], order[t]))
+    return ranked[:limit]
+
+
+def job_id(text: str, keywords: Optional[Sequence[str]] = None) -> str:
+    """Stable id for a job description and keyword list, so clients can refer back to it."""
+    raw = " ".join(text.lower().split()) + "\0" + ",".join(sorted(_normalize_keyword(k) for k in keywords or ()))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+class JobProfile:
+    """A job description's term counts, keywords and sublinear TF vector, computed once and reused."""
+
+    def __init__(self, text: str, keywords: Optional[Sequence[str]] = None):
+        import numpy as np
+
+        self.id = job_id(text, keywords)
+        counts = Counter(terms(text))
+        self.terms = list(counts)
+        self.tf = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))
+        given = [k for k in (_normalize_keyword(k) for k in keywords or ()) if k]
+        self.keywords = list(dict.fromkeys(given)) if given else _auto_keywords(counts, ATS_MAX_KEYWORDS)
+
+
+def _has_keyword(keyword: str, resume_terms: set, resume_text: str) -> bool:
+    if keyword in resume_terms:
+        return True
+    # Phrases longer than a bigram aren't indexed; look for them in the text instead
+    return keyword.count(" ") > 1 and keyword in resume_text
+
+
+def score_batch(job: JobProfile, texts: Sequence[str]) -> List[Dict]:
+    """Score resumes against ``job``; one dict per text, in input order.
+
+    TF-IDF uses sublinear term frequency and smoothed IDF fitted on the batch
+    plus the job description, so terms every resume shares count for little.
+    Vectors are kept sparse as (row, column, weight) arrays; norms and dot
+    products with the job vector are single ``bincount`` passes. Scores are
+    relative to the batch: rank all candidates for one job in the same call.
+    """
+    import numpy as np
+
+    n = len(texts)
+    if n == 0:
+        return []
+    lowered = [" ".join(text.lower().split()) for text in texts]
+    doc_counts = [Counter(terms(text)) for text in lowered]
+
+    # The job's terms take the first columns so its vector is a prefix
+    vocab = {term: i for i, term in enumerate(job.terms)}
+    cols = np.fromiter(
+        (vocab.setdefault(term, len(vocab)) for counts in doc_counts for term in counts),
+        dtype=np.int64, count=sum(len(counts) for counts in doc_counts),
+    )
+    freqs = np.fromiter((f for counts in doc_counts for f in counts.values()), dtype=np.float64, count=len(cols))
+    rows = np.repeat(np.arange(n), [len(counts) for counts in doc_counts])
+    size = len(vocab)
+
+    df = np.bincount(cols, minlength=size).astype(np.float64)
+    df[:len(job.terms)] += 1
+    idf = np.log((1.0 + n + 1) / (1.0 + df)) + 1.0
+
+    job_vector = np.zeros(size)
+    job_vector[:len(job.terms)] = job.tf * idf[:len(job.terms)]
+    job_norm = np.linalg.norm(job_vector)
+
+    weights = (1.0 + np.log(freqs)) * idf[cols]
+    norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=n))
+    dots = np.bincount(rows, weights=weights * job_vector[cols], minlength=n)
+    denominators = norms * job_norm
+    similarity = np.divide(dots, denominators, out=np.zeros(n), where=denominators > 0)
+
+    results = []
+    for i in range(n):
+        present = set(doc_counts[i])
+        matched = [k for k in job.keywords if _has_keyword(k, present, lowered[i])]
+        coverage = len(matched) / len(job.keywords) if job.keywords else 0.0
+        sim = float(similarity[i])
+        results.append({
+            "score": round(100 * (ATS_SIMILARITY_WEIGHT * sim + (1 - ATS_SIMILARITY_WEIGHT) * coverage), 1),
+            "similarity": round(sim, 4),
+            "keyword_coverage": round(coverage, 4),
+            "matched_keywords": matched,
+            "missing_keywords": [k for k in job.keywords if k not in matched],
+        })
+    return results
@@ -1,44 +1,183 @@
+import asyncio
 import hashlib
 import hmac
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from cache import TTLCache
+import features
+import metrics
 
 load_dotenv()
 
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
+SECRET_KEY = os.getenv("SECRET_KEY")
+# Without a signing key no session is issued or accepted; auth endpoints answer 503
+sessions = features.env_feature("sessions", "SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+VERIFIED_TOKEN_CACHE_SIZE = int(os.getenv("VERIFIED_TOKEN_CACHE_SIZE", "4096"))
+
+# Password hashes are stored as $<scheme>$<iterations>$<salt hex>$<hash hex>.
+# Changing the scheme or iteration count re-hashes users on their next login.
+_HASH_DIGESTS = {"pbkdf2-sha256": "sha256", "pbkdf2-sha512": "sha512"}
+PASSWORD_HASH_SCHEME = os.getenv("PASSWORD_HASH_SCHEME", "pbkdf2-sha256")
+PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", "100000"))
+# Rows written before the versioned format: 64 hex chars of salt + PBKDF2-SHA256 hash
+LEGACY_HASH_ITERATIONS = 100000
+
+# Hashing runs on a bounded thread pool (hashlib releases the GIL) with a queue limit
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+_hash_pool: Optional[ThreadPoolExecutor] = None
+_hash_pending = 0
+_hash_stats = {"completed": 0, "rejected": 0, "total_ms": 0.0, "max_ms": 0.0}
+
+# Claims of access tokens whose signature was already checked, kept until they expire
+_verified_tokens = TTLCache(VERIFIED_TOKEN_CACHE_SIZE, ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+metrics.register_cache("verified_tokens", _verified_tokens.stats)
+_bearer = HTTPBearer(auto_error=False)
+
+
+class HashPoolSaturated(Exception):
+    """Raised when too many password hashes are already queued."""
+
 
 def hashed_pass(password: str) -> str:
-    """Hash password using SHA256 with salt"""
+    """Hash password with the configured PBKDF2 scheme and a random salt"""
     salt = os.urandom(32)  # Generate a random salt
-    pwdhash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, 100000)
-    return salt.hex() + pwdhash.hex()
+    digest = _HASH_DIGESTS[PASSWORD_HASH_SCHEME]
+    pwdhash = hashlib.pbkdf2_hmac(digest, password.encode('utf-8'), salt, PASSWORD_HASH_ITERATIONS)
+    return f"${PASSWORD_HASH_SCHEME}${PASSWORD_HASH_ITERATIONS}${salt.hex()}${pwdhash.hex()}"
+
+def _parse_hash(hashed: str):
+    if hashed.startswith("$"):
+        _, scheme, iterations, salt, stored_hash = hashed.split("$")
+        return scheme, int(iterations), bytes.fromhex(salt), stored_hash
+    return "pbkdf2-sha256", LEGACY_HASH_ITERATIONS, bytes.fromhex(hashed[:64]), hashed[64:]
 
 def verify_hash_pass(password: str, hashed: str) -> bool:
-    """Verify password against hash"""
+    """Verify password against a versioned or legacy hash"""
     try:
-        salt = bytes.fromhex(hashed[:64])  # First 64 chars are salt
-        stored_hash = hashed[64:]  # Rest is the hash
-        pwdhash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, 100000)
+        scheme, iterations, salt, stored_hash = _parse_hash(hashed)
+        pwdhash = hashlib.pbkdf2_hmac(_HASH_DIGESTS[scheme], password.encode('utf-8'), salt, iterations)
         return hmac.compare_digest(stored_hash, pwdhash.hex())
     except:
         return False
 
-def jwt_encode(data: dict) -> str:
+def needs_rehash(hashed: str) -> bool:
+    """True if the hash was made with an older format, scheme or iteration count"""
+    if not hashed.startswith("$"):
+        return True
+    try:
+        scheme, iterations, _, _ = _parse_hash(hashed)
+    except ValueError:
+        return False
+    return scheme != PASSWORD_HASH_SCHEME or iterations != PASSWORD_HASH_ITERATIONS
+
+async def _run_hash_job(fn, *args):
+    global _hash_pool, _hash_pending
+    if _hash_pending >= PASSWORD_HASH_MAX_PENDING:
+        _hash_stats["rejected"] += 1
+        raise HashPoolSaturated(f"{_hash_pending} password hashes already pending")
+    if _hash_pool is None:
+        _hash_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+    _hash_pending += 1
+    start = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_pool, fn, *args)
+    finally:
+        _hash_pending -= 1
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        _hash_stats["completed"] += 1
+        _hash_stats["total_ms"] += elapsed_ms
+        _hash_stats["max_ms"] = max(_hash_stats["max_ms"], elapsed_ms)
+
+async def hash_password(password: str) -> str:
+    """hashed_pass on the hashing pool, off the event loop"""
+    return await _run_hash_job(hashed_pass, password)
+
+async def verify_password(password: str, hashed: str) -> bool:
+    """verify_hash_pass on the hashing pool, off the event loop"""
+    return await _run_hash_job(verify_hash_pass, password, hashed)
+
+def hash_pool_stats() -> dict:
+    completed = _hash_stats["completed"]
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "pending": _hash_pending,
+        "max_pending": PASSWORD_HASH_MAX_PENDING,
+        "completed": completed,
+        "rejected": _hash_stats["rejected"],
+        "avg_ms": round(_hash_stats["total_ms"] / completed, 1) if completed else 0.0,
+        "max_ms": round(_hash_stats["max_ms"], 1),
+    }
+
+def shutdown_hash_pool():
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = None
+
+def jwt_encode(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT token"""
+    if not SECRET_KEY:
+        raise RuntimeError("SECRET_KEY is not set; refusing to sign tokens")
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 def jwt_decode(token: str) -> dict:
     """Decode JWT token"""
+    if not SECRET_KEY:
+        return {}
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         return payload
     except JWTError:
-        return {}
\ No newline at end of file
+        return {}
+
+def create_session_tokens(uid: str, username: str) -> dict:
+    """Short-lived access token plus a long-lived refresh token for a user"""
+    claims = {"sub": uid, "username": username}
+    return {
+        "token": jwt_encode({**claims, "type": "access"}),
+        "refresh_token": jwt_encode({**claims, "type": "refresh"}, timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)),
+    }
+
+def verify_access_token(token: str) -> dict:
+    """Claims of a valid access token, or {}. Repeat checks of a hot token skip the signature check."""
+    claims = _verified_tokens.get(token)
+    if claims is not None:
+        if claims["exp"] > time.time():
+            return claims
+        _verified_tokens.pop(token)
+        return {}
+    claims = jwt_decode(token)
+    if claims.get("type") != "access" or not claims.get("sub"):
+        return {}
+    _verified_tokens.set(token, claims, ttl=max(0.0, claims["exp"] - time.time()))
+    return claims
+
+async def get_optional_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)) -> Optional[dict]:
+    """FastAPI dependency: the access token's claims, or None if no valid token was sent"""
+    if credentials is None:
+        return None
+    return verify_access_token(credentials.credentials) or None
+
+async def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)) -> dict:
+    """FastAPI dependency: the access token's claims; 401 without a valid token"""
+    sessions.require()
+    claims = verify_access_token(credentials.credentials) if credentials else {}
+    if not claims:
+        raise HTTPException(status_code=401, detail="Invalid or expired token", headers={"WWW-Authenticate": "Bearer"})
+    return claims
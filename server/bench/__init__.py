@@ -0,0 +1 @@
+"""Offline load tests: the real app against local stand-ins for Supabase, Gemini, Classroom and Liveblocks."""
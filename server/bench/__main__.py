@@ -0,0 +1,177 @@
+"""Run the offline benchmark suite: python -m bench [options] (from the server directory).
+
+Starts bench.fakes and main:app as separate uvicorn processes, wires the app to
+the fakes through its *_URL settings, then runs each scenario and prints
+throughput and p50/p95/p99 latency per operation.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+import httpx
+
+from bench.load import Recorder, format_table, run_closed_loop
+from bench.scenarios import SCENARIOS
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Rough production round-trip times, in ms, used unless overridden with --latency
+DEFAULT_LATENCY_MS = {"supabase": 8, "gemini": 700, "classroom": 90, "liveblocks": 60}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _per_upstream(values: List[str], flag: str) -> Dict[str, float]:
+    """Parse repeated UPSTREAM=VALUE options; "all" applies to every upstream."""
+    out = {}
+    for item in values:
+        upstream, sep, value = item.partition("=")
+        if not sep or (upstream != "all" and upstream not in DEFAULT_LATENCY_MS):
+            raise SystemExit(f"{flag} expects UPSTREAM=VALUE with UPSTREAM one of all, {', '.join(DEFAULT_LATENCY_MS)}")
+        for name in (DEFAULT_LATENCY_MS if upstream == "all" else [upstream]):
+            out[name] = float(value)
+    return out
+
+
+def _wait_ready(url: str, proc: subprocess.Popen, log_path: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            break
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    with open(log_path) as log:
+        sys.stderr.write(log.read()[-4000:])
+    raise SystemExit(f"{url} did not come up; see {log_path}")
+
+
+@contextmanager
+def _serve(module_app: str, port: int, env: dict, log_path: str, ready_path: str):
+    with open(log_path, "w") as log:
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", module_app, "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning", "--no-access-log"],
+            cwd=SERVER_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+    try:
+        _wait_ready(f"http://127.0.0.1:{port}{ready_path}", proc, log_path)
+        yield
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def _fake_env(args, latency: Dict[str, float], errors: Dict[str, float]) -> dict:
+    env = dict(os.environ)
+    for upstream, ms in latency.items():
+        env[f"FAKE_{upstream.upper()}_LATENCY_MS"] = str(ms)
+        env[f"FAKE_{upstream.upper()}_JITTER_MS"] = str(ms * args.jitter)
+    for upstream, rate in errors.items():
+        env[f"FAKE_{upstream.upper()}_ERROR_RATE"] = str(rate)
+    return env
+
+
+def _app_env(fake_url: str, workdir: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "SUPABASE_URL": fake_url,
+        "SUPABASE_KEY": "bench",
+        "GEMINI_API_KEY": "bench",
+        "GEMINI_API_URL": fake_url,
+        "CLASSROOM_API_URL": f"{fake_url}/v1",
+        "GOOGLE_TOKENINFO_URL": f"{fake_url}/tokeninfo",
+        "LIVEBLOCKS_API_URL": f"{fake_url}/v2/authorize-user",
+        "LIVEBLOCKS_SECRET_KEY": "bench",
+        "SECRET_KEY": "bench",
+        # A fresh PDF text cache so every run starts cold
+        "PDF_CACHE_DIR": os.path.join(workdir, "pdf-cache"),
+        "LOG_LEVEL": env.get("LOG_LEVEL", "WARNING"),
+    })
+    return env
+
+
+async def _run_scenario(name: str, app_url: str, fake_url: str, args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency * 8, max_keepalive_connections=args.concurrency * 8)
+    async with httpx.AsyncClient(base_url=app_url, timeout=120.0, limits=limits) as client, \
+            httpx.AsyncClient(base_url=fake_url) as control:
+        scenario = SCENARIOS[name](client, args.users)
+        await scenario.setup()
+        before = (await control.get("/_stats")).json()
+        rec = Recorder()
+        rec.elapsed = await run_closed_loop(lambda i: scenario.step(i, rec), args.requests, args.concurrency)
+        after = (await control.get("/_stats")).json()
+    upstream_calls = {up: after["calls"][up] - before["calls"][up] for up in after["calls"]}
+    return {
+        "scenario": name,
+        "description": scenario.description,
+        "iterations": args.requests,
+        "concurrency": args.concurrency,
+        "wall_s": round(rec.elapsed, 3),
+        "upstream_calls": {up: n for up, n in upstream_calls.items() if n},
+        "operations": rec.summary(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description=__doc__.splitlines()[0])
+    parser.add_argument("scenarios", nargs="*", metavar="SCENARIO",
+                        help=f"scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("-n", "--requests", type=int, default=200, help="iterations per scenario (default 200)")
+    parser.add_argument("-c", "--concurrency", type=int, default=20, help="concurrent virtual users (default 20)")
+    parser.add_argument("--users", type=int, default=50, help="distinct accounts/students seeded (default 50)")
+    parser.add_argument("--latency", action="append", default=[], metavar="UPSTREAM=MS",
+                        help="mean upstream latency, e.g. --latency gemini=1200 or --latency all=0")
+    parser.add_argument("--jitter", type=float, default=0.25, help="latency jitter as a fraction of the mean (default 0.25)")
+    parser.add_argument("--error-rate", action="append", default=[], metavar="UPSTREAM=RATE",
+                        help="fraction of upstream calls answered with a 503, e.g. --error-rate classroom=0.05")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON, for comparing runs")
+    args = parser.parse_args(argv)
+
+    latency = {**DEFAULT_LATENCY_MS, **_per_upstream(args.latency, "--latency")}
+    errors = _per_upstream(args.error_rate, "--error-rate")
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s) {', '.join(unknown)}; choose from {', '.join(SCENARIOS)}")
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="hackbuild-bench-") as workdir:
+        fake_port, app_port = _free_port(), _free_port()
+        fake_url, app_url = f"http://127.0.0.1:{fake_port}", f"http://127.0.0.1:{app_port}"
+        fake_log, app_log = os.path.join(workdir, "fakes.log"), os.path.join(workdir, "app.log")
+        with _serve("bench.fakes:app", fake_port, _fake_env(args, latency, errors), fake_log, "/_health"), \
+                _serve("main:app", app_port, _app_env(fake_url, workdir), app_log, "/metrics"):
+            print(f"upstream latency (ms): {latency}" + (f", error rates: {errors}" if errors else ""))
+            for name in names:
+                result = asyncio.run(_run_scenario(name, app_url, fake_url, args))
+                results.append(result)
+                print()
+                print(format_table(f"{name}: {result['description']}", result["operations"]))
+                print(f"wall {result['wall_s']}s, upstream calls {result['upstream_calls']}")
+
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump({"latency_ms": latency, "error_rates": errors, "results": results}, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
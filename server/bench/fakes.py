@@ -0,0 +1,365 @@
+"""Local stand-ins for every upstream the server talks to, in one ASGI app.
+
+- PostgREST (Supabase) under /rest/v1: in-memory tables with the filters,
+  ordering, upserts and RPC the routers use.
+- Gemini under /v1beta and /v1beta2: canned generate and SSE stream replies.
+- Google Classroom under /v1/courses and the OAuth tokeninfo endpoint.
+- Liveblocks under /v2/authorize-user.
+
+Each upstream has its own latency and error injection, set from
+FAKE_<UPSTREAM>_LATENCY_MS / _JITTER_MS / _ERROR_RATE / _ERROR_STATUS or at
+runtime with POST /_faults. Run with ``uvicorn bench.fakes:app``.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from fastapi import Body, FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
+from jose import jwt
+
+UPSTREAMS = ("supabase", "gemini", "classroom", "liveblocks")
+
+# Course and coursework counts served to every Classroom user
+FAKE_CLASSROOM_COURSES = int(os.getenv("FAKE_CLASSROOM_COURSES", "5"))
+FAKE_CLASSROOM_COURSEWORK = int(os.getenv("FAKE_CLASSROOM_COURSEWORK", "8"))
+# Words per Gemini reply and how many SSE chunks it is streamed in
+FAKE_GEMINI_WORDS = int(os.getenv("FAKE_GEMINI_WORDS", "60"))
+FAKE_GEMINI_STREAM_CHUNKS = int(os.getenv("FAKE_GEMINI_STREAM_CHUNKS", "6"))
+
+
+@dataclass
+class Fault:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+
+    @classmethod
+    def from_env(cls, upstream: str) -> "Fault":
+        prefix = f"FAKE_{upstream.upper()}_"
+        return cls(
+            latency_ms=float(os.getenv(prefix + "LATENCY_MS", "0")),
+            jitter_ms=float(os.getenv(prefix + "JITTER_MS", "0")),
+            error_rate=float(os.getenv(prefix + "ERROR_RATE", "0")),
+            error_status=int(os.getenv(prefix + "ERROR_STATUS", "503")),
+        )
+
+
+_faults: Dict[str, Fault] = {upstream: Fault.from_env(upstream) for upstream in UPSTREAMS}
+_calls: Dict[str, int] = {upstream: 0 for upstream in UPSTREAMS}
+_injected: Dict[str, int] = {upstream: 0 for upstream in UPSTREAMS}
+
+app = FastAPI()
+
+
+def _json(content, status_code: int = 200) -> Response:
+    return Response(json.dumps(content), status_code=status_code, media_type="application/json")
+
+
+async def _inject(upstream: str) -> Optional[Response]:
+    """Sleep for the configured latency; return an error response if this call should fail."""
+    fault = _faults[upstream]
+    _calls[upstream] += 1
+    delay = fault.latency_ms + random.uniform(-fault.jitter_ms, fault.jitter_ms)
+    if delay > 0:
+        await asyncio.sleep(delay / 1000.0)
+    if fault.error_rate and random.random() < fault.error_rate:
+        _injected[upstream] += 1
+        return _json({"error": {"code": fault.error_status, "message": "injected failure"}}, fault.error_status)
+    return None
+
+
+# ---------------------------------------------------------------- PostgREST
+
+TABLES: Dict[str, List[dict]] = {
+    "login": [], "branch": [], "subject": [], "quiz": [], "user_subject": [], "student_subject": [],
+}
+PRIMARY_KEYS = {
+    "login": ["uid"], "branch": ["branch_id"], "subject": ["subject_id"], "quiz": ["quiz_id"],
+    "user_subject": ["uid", "subject_id"], "student_subject": ["student_id", "subject_id"],
+}
+UNIQUE_KEYS = {"login": [["email"]]}
+
+_RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+
+def _pg_error(code: str, message: str, status_code: int) -> Response:
+    return _json({"code": code, "message": message, "details": "", "hint": None}, status_code)
+
+
+def _cast(value: str):
+    for kind in (int, float):
+        try:
+            return kind(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _matches(row: dict, params: List[tuple]) -> bool:
+    for column, expression in params:
+        if column in _RESERVED_PARAMS:
+            continue
+        op, _, value = expression.partition(".")
+        actual = row.get(column)
+        if op == "eq" and str(actual) != value:
+            return False
+        if op == "neq" and str(actual) == value:
+            return False
+        if op in ("gt", "gte", "lt", "lte"):
+            if actual is None:
+                return False
+            bound = _cast(value) if not isinstance(actual, str) else value
+            if not {"gt": actual > bound, "gte": actual >= bound, "lt": actual < bound, "lte": actual <= bound}[op]:
+                return False
+        if op == "in" and str(actual) not in [v.strip('"') for v in value.strip("()").split(",")]:
+            return False
+    return True
+
+
+def _project(rows: List[dict], select: str) -> List[dict]:
+    if select == "*":
+        return [dict(row) for row in rows]
+    columns = [c.strip() for c in select.split(",")]
+    return [{c: row.get(c) for c in columns} for row in rows]
+
+
+def _same_row(table: str, row: dict, item: dict) -> bool:
+    keys = [PRIMARY_KEYS[table], *UNIQUE_KEYS.get(table, [])]
+    return any(all(row.get(k) == item.get(k) for k in key) for key in keys)
+
+
+def _select(table: str, request: Request, params: List[tuple]) -> Response:
+    query = dict(params)
+    rows = [row for row in TABLES[table] if _matches(row, params)]
+    if "order" in query:
+        for term in reversed(query["order"].split(",")):
+            column, _, direction = term.partition(".")
+            rows.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=direction.startswith("desc"))
+    offset = int(query.get("offset", 0))
+    rows = rows[offset:offset + int(query["limit"])] if "limit" in query else rows[offset:]
+    rows = _project(rows, query.get("select", "*"))
+    if "vnd.pgrst.object" in request.headers.get("accept", ""):
+        if len(rows) != 1:
+            return _pg_error("PGRST116", "JSON object requested, multiple (or no) rows returned", 406)
+        return _json(rows[0])
+    return _json(rows)
+
+
+def _insert(table: str, body, prefer: str) -> Response:
+    rows = TABLES[table]
+    written = []
+    for item in body if isinstance(body, list) else [body]:
+        existing = next((row for row in rows if _same_row(table, row, item)), None)
+        if existing is None:
+            rows.append(dict(item))
+            written.append(dict(item))
+        elif "resolution=merge-duplicates" in prefer:
+            existing.update(item)
+            written.append(dict(existing))
+        elif "resolution=ignore-duplicates" not in prefer:
+            return _pg_error("23505", "duplicate key value violates unique constraint", 409)
+    if "return=minimal" in prefer:
+        return Response(status_code=201)
+    return _json(written, 201)
+
+
+@app.post("/rest/v1/rpc/mark_attendance")
+async def mark_attendance(request: Request):
+    failure = await _inject("supabase")
+    if failure is not None:
+        return failure
+    body = json.loads(await request.body())
+    marked = [(s, True) for s in body["p_present"]] + [(s, False) for s in body["p_absent"]]
+    rows = TABLES["student_subject"]
+    out = []
+    for student_id, present in marked:
+        row = next((r for r in rows if r["student_id"] == student_id and r["subject_id"] == body["p_subject_id"]), None)
+        if row is None:
+            row = {"student_id": student_id, "subject_id": body["p_subject_id"], "attendance": 0, "attended": 0, "sessions": 0}
+            rows.append(row)
+        row["attended"] = row.get("attended", 0) + int(present)
+        row["sessions"] = row.get("sessions", 0) + 1
+        row["attendance"] = round(100.0 * row["attended"] / row["sessions"], 2)
+        out.append(dict(row))
+    return _json(out)
+
+
+@app.post("/rest/v1/rpc/set_attendance")
+async def set_attendance(request: Request):
+    failure = await _inject("supabase")
+    if failure is not None:
+        return failure
+    body = json.loads(await request.body())
+    out = []
+    for row in TABLES["student_subject"]:
+        if row["student_id"] == body["p_student_id"] and row["subject_id"] == body["p_subject_id"]:
+            row["sessions"] = body.get("p_sessions") or max(row.get("sessions", 0), 1)
+            row["attended"] = round(body["p_attendance"] / 100.0 * row["sessions"], 2)
+            row["attendance"] = body["p_attendance"]
+            out.append(dict(row))
+    return _json(out)
+
+
+@app.api_route("/rest/v1/{table}", methods=["GET", "HEAD", "POST", "PATCH", "DELETE"])
+async def postgrest(table: str, request: Request):
+    if table not in TABLES:
+        return _pg_error("42P01", f'relation "public.{table}" does not exist', 404)
+    failure = await _inject("supabase")
+    if failure is not None:
+        return failure
+    params = list(request.query_params.multi_items())
+    if request.method in ("GET", "HEAD"):
+        return _select(table, request, params)
+    if request.method == "POST":
+        return _insert(table, json.loads(await request.body()), request.headers.get("prefer", ""))
+    matched = [row for row in TABLES[table] if _matches(row, params)]
+    if request.method == "PATCH":
+        changes = json.loads(await request.body())
+        for row in matched:
+            row.update(changes)
+    else:
+        TABLES[table] = [row for row in TABLES[table] if row not in matched]
+    return _json([dict(row) for row in matched])
+
+
+# ---------------------------------------------------------------- Gemini
+
+def _reply_text(prompt: str) -> str:
+    """Deterministic JSON reply, so identical prompts get identical answers."""
+    seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    words = " ".join(f"w{seed[i % 64]}{i}" for i in range(FAKE_GEMINI_WORDS))
+    return json.dumps({"answer": words, "seed": seed[:16]})
+
+
+@app.post("/v1beta2/models/{model_action}")
+async def gemini_generate(model_action: str, payload: dict = Body(...)):
+    failure = await _inject("gemini")
+    if failure is not None:
+        return failure
+    text = _reply_text(payload.get("prompt", {}).get("text", ""))
+    return {"candidates": [{"content": [{"text": text}]}]}
+
+
+@app.post("/v1beta/models/{model_action}")
+async def gemini_stream(model_action: str, payload: dict = Body(...)):
+    failure = await _inject("gemini")
+    if failure is not None:
+        return failure
+    prompt = "".join(p.get("text", "") for c in payload.get("contents", []) for p in c.get("parts", []))
+    text = _reply_text(prompt)
+    step = max(1, -(-len(text) // FAKE_GEMINI_STREAM_CHUNKS))
+    fault = _faults["gemini"]
+
+    async def events():
+        for start in range(0, len(text), step):
+            chunk = {"candidates": [{"content": {"role": "model", "parts": [{"text": text[start:start + step]}]}}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            # Spread the configured latency again across the chunks, like token generation
+            await asyncio.sleep(fault.latency_ms / 1000.0 / FAKE_GEMINI_STREAM_CHUNKS)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+# ---------------------------------------------------------------- Classroom
+
+def _bearer(request: Request) -> str:
+    return request.headers.get("authorization", "").removeprefix("Bearer ")
+
+
+@app.get("/tokeninfo")
+async def tokeninfo(access_token: str = ""):
+    failure = await _inject("classroom")
+    if failure is not None:
+        return failure
+    if not access_token:
+        return _json({"error": "invalid_token"}, 400)
+    return {"sub": hashlib.sha256(access_token.encode()).hexdigest()[:21], "expires_in": "3599"}
+
+
+@app.get("/v1/courses")
+async def courses(request: Request):
+    failure = await _inject("classroom")
+    if failure is not None:
+        return failure
+    owner = hashlib.sha256(_bearer(request).encode()).hexdigest()[:8]
+    return {"courses": [{"id": f"{owner}-{i}", "name": f"Course {i}"} for i in range(FAKE_CLASSROOM_COURSES)]}
+
+
+@app.get("/v1/courses/{course_id}/courseWork")
+async def course_work(course_id: str, pageSize: int = 100):
+    failure = await _inject("classroom")
+    if failure is not None:
+        return failure
+    today = datetime.now(timezone.utc).date()
+    work = []
+    for i in range(FAKE_CLASSROOM_COURSEWORK):
+        due = today + timedelta(days=FAKE_CLASSROOM_COURSEWORK - i)
+        work.append({
+            "id": f"{course_id}-w{i}",
+            "title": f"Assignment {i}",
+            "description": f"Coursework {i} for {course_id}",
+            "dueDate": {"year": due.year, "month": due.month, "day": due.day},
+            "dueTime": {"hours": 23, "minutes": 59},
+            "updateTime": "2024-01-01T00:00:00Z",
+        })
+    return {"courseWork": work[:pageSize]}
+
+
+# ---------------------------------------------------------------- Liveblocks
+
+@app.post("/v2/authorize-user")
+async def authorize_user(payload: dict = Body(...)):
+    failure = await _inject("liveblocks")
+    if failure is not None:
+        return failure
+    now = int(time.time())
+    claims = {"k": "acc", "pid": "bench", "uid": payload.get("userId"), "perms": payload.get("permissions"),
+              "iat": now, "exp": now + 3600}
+    return {"token": jwt.encode(claims, "fake-liveblocks", algorithm="HS256")}
+
+
+# ---------------------------------------------------------------- Control
+
+@app.get("/_health")
+async def health():
+    return {"ok": True}
+
+
+@app.get("/_faults")
+async def get_faults():
+    return {upstream: asdict(fault) for upstream, fault in _faults.items()}
+
+
+@app.post("/_faults")
+async def set_faults(changes: Dict[str, dict] = Body(...)):
+    """Update latency/error settings, e.g. {"gemini": {"latency_ms": 800, "error_rate": 0.1}}."""
+    for upstream, settings in changes.items():
+        _faults[upstream] = Fault(**{**asdict(_faults[upstream]), **settings})
+    return await get_faults()
+
+
+@app.get("/_stats")
+async def stats():
+    return {
+        "calls": _calls,
+        "injected_errors": _injected,
+        "rows": {table: len(rows) for table, rows in TABLES.items()},
+    }
+
+
+@app.post("/_reset")
+async def reset():
+    for table in TABLES:
+        TABLES[table] = []
+    for counts in (_calls, _injected):
+        for upstream in counts:
+            counts[upstream] = 0
+    return {"ok": True}
@@ -0,0 +1,88 @@
+"""Closed-loop load generation and latency summaries for the benchmark scenarios."""
+import asyncio
+import math
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Recorder:
+    """Collects per-operation latencies, error counts and status codes during a run."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.statuses: Dict[str, Dict[int, int]] = {}
+        self.elapsed = 0.0
+
+    def record(self, name: str, seconds: float, ok: bool, status: int = 0):
+        self.latencies.setdefault(name, []).append(seconds)
+        self.errors[name] = self.errors.get(name, 0) + (not ok)
+        counts = self.statuses.setdefault(name, {})
+        counts[status] = counts.get(status, 0) + 1
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        """Send one request and record it. Error envelopes ({"error": true}) count as failures."""
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.record(name, time.perf_counter() - start, False)
+            return None
+        elapsed = time.perf_counter() - start
+        ok = response.status_code < 400
+        if ok and response.headers.get("content-type", "").startswith("application/json"):
+            body = response.json()
+            ok = not (isinstance(body, dict) and body.get("error") is True)
+        self.record(name, elapsed, ok, response.status_code)
+        return response
+
+    def summary(self) -> Dict[str, dict]:
+        out = {}
+        for name, values in self.latencies.items():
+            ordered = sorted(values)
+            out[name] = {
+                "requests": len(ordered),
+                "errors": self.errors.get(name, 0),
+                "throughput_rps": round(len(ordered) / self.elapsed, 1) if self.elapsed else 0.0,
+                "mean_ms": round(1000 * sum(ordered) / len(ordered), 2),
+                "p50_ms": round(1000 * percentile(ordered, 50), 2),
+                "p95_ms": round(1000 * percentile(ordered, 95), 2),
+                "p99_ms": round(1000 * percentile(ordered, 99), 2),
+                "max_ms": round(1000 * ordered[-1], 2),
+                "statuses": {str(status): n for status, n in sorted(self.statuses.get(name, {}).items())},
+            }
+        return out
+
+
+async def run_closed_loop(step: Callable[[int], Awaitable[None]], iterations: int, concurrency: int) -> float:
+    """Run ``step(i)`` for i in range(iterations) on ``concurrency`` workers; returns wall time."""
+    counter = iter(range(iterations))
+
+    async def worker():
+        for i in counter:
+            await step(i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, iterations)))))
+    return time.perf_counter() - start
+
+
+def format_table(scenario: str, summary: Dict[str, dict]) -> str:
+    header = f"{'operation':<34}{'reqs':>7}{'errs':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+    lines = [f"== {scenario}", header, "-" * len(header)]
+    for name, row in summary.items():
+        lines.append(
+            f"{name:<34}{row['requests']:>7}{row['errors']:>6}{row['throughput_rps']:>9}"
+            f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['max_ms']:>9}"
+        )
+    return "\n".join(lines)
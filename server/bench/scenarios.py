@@ -0,0 +1,217 @@
+"""Scripted traffic shapes. Each scenario seeds what it needs through the public API, untimed,
+then runs ``step(i)`` in a closed loop while a Recorder times every request."""
+import asyncio
+import json
+import time
+from typing import Dict, List, Type
+
+import httpx
+
+from bench.load import Recorder
+
+SUBJECTS_PER_BRANCH = 8
+SUBJECTS_PER_USER = 6
+
+
+class Scenario:
+    name = ""
+    description = ""
+
+    def __init__(self, client: httpx.AsyncClient, users: int):
+        self.client = client
+        self.users = users
+
+    async def setup(self):
+        pass
+
+    async def step(self, i: int, rec: Recorder):
+        raise NotImplementedError
+
+    async def _each(self, items, fn, concurrency: int = 16):
+        """Run ``fn(item)`` over ``items`` with bounded concurrency (setup only, untimed)."""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(item):
+            async with semaphore:
+                return await fn(item)
+
+        return await asyncio.gather(*(run(item) for item in items))
+
+    async def _register(self, prefix: str) -> List[dict]:
+        """Create ``users`` accounts; returns their credentials and session tokens."""
+        async def register(i: int) -> dict:
+            account = {"email": f"{prefix}-{i}@bench.local", "password": f"pw-{prefix}-{i}"}
+            response = await self.client.post("/auth/register", json={
+                **account, "username": f"{prefix}{i}", "name": f"Bench {i}",
+                "college": "Bench College", "branch": "CSE", "year": "2",
+            })
+            response.raise_for_status()
+            return {**account, "token": response.json()["token"]}
+
+        return await self._each(range(self.users), register, concurrency=4)
+
+
+class LoginStorm(Scenario):
+    name = "login_storm"
+    description = "Many users signing in at once (password hashing pool, login lookups)"
+
+    async def setup(self):
+        self.accounts = await self._register("storm")
+
+    async def step(self, i: int, rec: Recorder):
+        account = self.accounts[i % len(self.accounts)]
+        await rec.request(self.client, "POST /auth/login", "POST", "/auth/login",
+                          json={"email": account["email"], "password": account["password"]})
+
+
+def _ndjson(rows: List[dict]) -> bytes:
+    return "".join(json.dumps(row) + "\n" for row in rows).encode()
+
+
+async def _timed_page(rec: Recorder, name: str, page):
+    start = time.perf_counter()
+    await page()
+    rec.record(name, time.perf_counter() - start, True)
+
+
+class DashboardLoad(Scenario):
+    name = "dashboard"
+    description = "Student dashboard: catalog, enrolments, attendance and Classroom assignments in parallel"
+    branches = 10
+
+    async def setup(self):
+        branches = [{"branch_id": b, "branch_name": f"Branch {b}"} for b in range(1, self.branches + 1)]
+        subjects = [
+            {"subject_id": b * 100 + s, "subject_name": f"Subject {b}.{s}", "branch_id": b, "sem": s % 8 + 1}
+            for b in range(1, self.branches + 1) for s in range(SUBJECTS_PER_BRANCH)
+        ]
+        for path, rows in (("/branch/import", branches), ("/subject/import", subjects)):
+            files = {"file": ("rows.ndjson", _ndjson(rows), "application/x-ndjson")}
+            (await self.client.post(path, files=files)).raise_for_status()
+
+        def enrolled(user: int) -> List[int]:
+            branch = user % self.branches + 1
+            return [branch * 100 + s for s in range(SUBJECTS_PER_USER)]
+
+        async def enrol(user: int):
+            for subject_id in enrolled(user):
+                await self.client.post("/user-subject/add", json={"uid": user, "subject_id": subject_id})
+
+        await self._each(range(self.users), enrol)
+
+        # Three recorded sessions per subject, everyone present for the first two
+        async def mark(subject_id: int):
+            students = [f"student-{u}" for u in range(self.users) if subject_id in enrolled(u)]
+            for session in range(3):
+                present, absent = (students, []) if session < 2 else ([], students)
+                await self.client.post("/student-subject/mark-session",
+                                       json={"subject_id": subject_id, "present": present, "absent": absent})
+
+        await self._each(sorted({s for u in range(self.users) for s in enrolled(u)}), mark)
+
+    async def step(self, i: int, rec: Recorder):
+        user = i % self.users
+        google = {"Authorization": f"Bearer google-token-{user}"}
+
+        async def page():
+            await asyncio.gather(
+                rec.request(self.client, "GET /branch/all", "GET", "/branch/all"),
+                rec.request(self.client, "POST /subject/get-by-branch", "POST", "/subject/get-by-branch",
+                            json={"branch_id": user % self.branches + 1}),
+                rec.request(self.client, "POST /user-subject/get", "POST", "/user-subject/get", json={"uid": user}),
+                rec.request(self.client, "POST /student-subject/get", "POST", "/student-subject/get",
+                            json={"student_id": f"student-{user}"}),
+                rec.request(self.client, "GET /classroom/assignments", "GET", "/classroom/assignments", headers=google),
+            )
+
+        await _timed_page(rec, "dashboard page (all calls)", page)
+
+
+def _quiz(questions: int) -> dict:
+    return {
+        "title": "Benchmark quiz",
+        "description": "Generated for load tests",
+        "timeLimit": 30,
+        "questions": [
+            {
+                "question": f"Question {q}: which option is correct? " + "lorem ipsum " * 12,
+                "options": [f"Option {q}.{o} " + "dolor sit amet " * 3 for o in range(4)],
+                "answer": [q % 4],
+                "explanation": "Because the benchmark says so. " * 4,
+            }
+            for q in range(questions)
+        ],
+    }
+
+
+class QuizLaunch(Scenario):
+    name = "quiz_launch"
+    description = "A class opening a live quiz: fetch stems, join the Liveblocks room, re-poll with the hash"
+    quiz_id = 9001
+    questions = 40
+
+    async def setup(self):
+        self.accounts = await self._register("quiz")
+        response = await self.client.post("/quiz/add", json={"quiz_id": self.quiz_id, "quiz_data": _quiz(self.questions)})
+        response.raise_for_status()
+
+    async def step(self, i: int, rec: Recorder):
+        account = self.accounts[i % len(self.accounts)]
+
+        async def page():
+            fetched = await rec.request(self.client, "POST /quiz/get (stems)", "POST", "/quiz/get",
+                                        json={"quiz_id": self.quiz_id, "stems_only": True})
+            await rec.request(self.client, "POST /liveblocks/auth", "POST", "/liveblocks/auth",
+                              json={"room": f"quiz-{self.quiz_id}"},
+                              headers={"Authorization": f"Bearer {account['token']}"})
+            known_hash = fetched.json().get("content_hash") if fetched is not None and fetched.status_code == 200 else None
+            await rec.request(self.client, "POST /quiz/get (known hash)", "POST", "/quiz/get",
+                              json={"quiz_id": self.quiz_id, "known_hash": known_hash})
+
+        await _timed_page(rec, "quiz join (all calls)", page)
+
+
+def make_pdf(pages: List[str]) -> bytes:
+    """A minimal valid PDF with one line of Helvetica text per page."""
+    out = b"%PDF-1.4\n"
+    offsets = []
+
+    def add(num: int, content: bytes):
+        nonlocal out
+        offsets.append(len(out))
+        out += f"{num} 0 obj\n".encode() + content + b"\nendobj\n"
+
+    page_nums = [4 + 2 * i for i in range(len(pages))]
+    add(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    add(2, f"<< /Type /Pages /Kids [{' '.join(f'{p} 0 R' for p in page_nums)}] /Count {len(pages)} >>".encode())
+    add(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for num, text in zip(page_nums, pages):
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        add(num, f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {num + 1} 0 R "
+                 f"/Resources << /Font << /F1 3 0 R >> >> >>".encode())
+        add(num + 1, f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+    xref = len(out)
+    out += f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+class PdfUploadBurst(Scenario):
+    name = "pdf_upload"
+    description = "Resume/notes uploads arriving together; a quarter of them repeat an earlier file"
+    pages = 12
+
+    def _document(self, doc: int) -> bytes:
+        return make_pdf([f"Document {doc} page {p} experience python fastapi postgres" for p in range(self.pages)])
+
+    async def step(self, i: int, rec: Recorder):
+        # Every fourth upload re-sends a file seen before, to exercise the text cache
+        doc = i // 4 if i % 4 == 3 else i
+        files = {"pdf_file": (f"doc-{doc}.pdf", self._document(doc), "application/pdf")}
+        await rec.request(self.client, "POST /pdf/extract-pdf", "POST", "/pdf/extract-pdf", files=files)
+
+
+SCENARIOS: Dict[str, Type[Scenario]] = {
+    scenario.name: scenario for scenario in (LoginStorm, DashboardLoad, QuizLaunch, PdfUploadBurst)
+}
@@ -0,0 +1,223 @@
+import codecs
+import csv
+import json
+import os
+from collections import deque
+from typing import AsyncIterator, Iterator, List, Optional, Tuple, Type
+
+from fastapi import UploadFile
+from postgrest import AsyncPostgrestClient
+from postgrest.exceptions import APIError
+from pydantic import BaseModel, ValidationError
+
+from db import insert_unique, AlreadyExists
+
+BULK_IMPORT_CHUNK_ROWS = int(os.getenv("BULK_IMPORT_CHUNK_ROWS", "500"))
+BULK_IMPORT_MAX_ERRORS = int(os.getenv("BULK_IMPORT_MAX_ERRORS", "200"))
+# A quoted field may span lines, but a record longer than this is taken to be a stray quote
+BULK_IMPORT_MAX_RECORD_LINES = int(os.getenv("BULK_IMPORT_MAX_RECORD_LINES", "50"))
+READ_CHUNK_BYTES = 64 * 1024
+
+_FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+
+def detect_format(file: UploadFile) -> Optional[str]:
+    """Pick csv or ndjson from the upload's extension, falling back to its content type."""
+    name = (file.filename or "").lower()
+    for ext, fmt in _FORMATS.items():
+        if name.endswith(ext):
+            return fmt
+    content_type = (file.content_type or "").lower()
+    if "csv" in content_type:
+        return "csv"
+    if "ndjson" in content_type or "jsonl" in content_type:
+        return "ndjson"
+    return None
+
+
+async def _iter_lines(file: UploadFile) -> AsyncIterator[Tuple[int, str]]:
+    """Yield (line number, line) from an upload without holding the whole file in memory."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    line_no = 0
+    while True:
+        chunk = await file.read(READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        buffer += decoder.decode(chunk)
+        lines = buffer.split("\n")
+        buffer = lines.pop()
+        for line in lines:
+            line_no += 1
+            yield line_no, line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield line_no + 1, buffer.rstrip("\r")
+
+
+class _CsvParser:
+    """Turns lines into CSV records, joining the lines of quoted fields that span several.
+
+    Quote parity is kept as a running count, so each line is looked at once. A
+    record still open after BULK_IMPORT_MAX_RECORD_LINES lines is blamed on a
+    stray quote: only its first line fails and parsing resumes on the next one.
+    """
+
+    def __init__(self):
+        self.header: Optional[List[str]] = None
+        self._pending: List[Tuple[int, str]] = []
+        self._quotes = 0
+
+    def feed(self, line_no: int, line: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+        queue = deque([(line_no, line)])
+        while queue:
+            item = queue.popleft()
+            self._pending.append(item)
+            self._quotes += item[1].count('"')
+            # An odd number of quotes means a quoted field runs onto the next line
+            if self._quotes % 2 == 0:
+                yield from self._record()
+            elif len(self._pending) >= BULK_IMPORT_MAX_RECORD_LINES:
+                yield self._pending[0][0], None, "Unterminated quoted field"
+                queue.extendleft(reversed(self._drop()[1:]))
+
+    def finish(self) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+        while self._pending:
+            stray = self._drop()
+            yield stray[0][0], None, "Unterminated quoted field"
+            for line_no, line in stray[1:]:
+                yield from self.feed(line_no, line)
+
+    def _drop(self) -> List[Tuple[int, str]]:
+        pending, self._pending, self._quotes = self._pending, [], 0
+        return pending
+
+    def _record(self) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+        pending = self._drop()
+        fields = next(csv.reader(["\n".join(line for _, line in pending)]), [])
+        if not any(field.strip() for field in fields):
+            return
+        if self.header is None:
+            self.header = [field.strip() for field in fields]
+            return
+        if len(fields) != len(self.header):
+            yield pending[0][0], None, f"Expected {len(self.header)} columns, got {len(fields)}"
+            return
+        # Empty cells mean "not given" so optional fields fall back to their defaults
+        yield pending[0][0], {name: value for name, value in zip(self.header, fields) if value != ""}, None
+
+
+async def _csv_records(file: UploadFile) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    parser = _CsvParser()
+    async for line_no, line in _iter_lines(file):
+        for record in parser.feed(line_no, line):
+            yield record
+    for record in parser.finish():
+        yield record
+
+
+async def _ndjson_records(file: UploadFile) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    async for line_no, line in _iter_lines(file):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, "Expected a JSON object"
+            continue
+        yield line_no, record, None
+
+
+class _ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.skipped = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+
+    def skip(self, line: int, message: str):
+        self.skipped += 1
+        self._note(line, message)
+
+    def fail(self, line: int, message: str):
+        self.failed += 1
+        self._note(line, message)
+
+    def _note(self, line: int, message: str):
+        # Bound the report so a bad file can't grow the response without limit
+        if len(self.errors) < BULK_IMPORT_MAX_ERRORS:
+            self.errors.append({"line": line, "message": message})
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+
+
+async def _flush(db: AsyncPostgrestClient, table: str, key: str, batch: List[Tuple[int, dict]], report: _ImportReport):
+    rows = []
+    lines = {}
+    for line_no, row in batch:
+        if row[key] in lines:
+            report.skip(line_no, f"Duplicate {key} {row[key]} (first on line {lines[row[key]]})")
+            continue
+        lines[row[key]] = line_no
+        rows.append(row)
+    try:
+        response = await db.table(table).upsert(rows, on_conflict=key, ignore_duplicates=True).execute()
+    except APIError:
+        # Something other than the key clashed (e.g. an unknown branch_id); go row by row to find it
+        for row in rows:
+            try:
+                await insert_unique(db, table, row, on_conflict=key)
+                report.inserted += 1
+            except AlreadyExists:
+                report.skip(lines[row[key]], f"{key} {row[key]} already exists")
+            except APIError as e:
+                report.fail(lines[row[key]], e.message or str(e))
+        return
+    inserted = {row[key] for row in response.data or []}
+    for row in rows:
+        if row[key] in inserted:
+            report.inserted += 1
+        else:
+            report.skip(lines[row[key]], f"{key} {row[key]} already exists")
+
+
+async def import_rows(db: AsyncPostgrestClient, file: UploadFile, fmt: str, table: str,
+                      model: Type[BaseModel], key: str) -> dict:
+    """Stream a CSV/NDJSON upload into ``table`` in chunked batch inserts.
+
+    Each row is validated against ``model``; rows that fail validation or
+    collide with an existing ``key`` are reported by line number and the rest
+    are still imported. Only one chunk of rows is held in memory at a time.
+    """
+    records = _csv_records(file) if fmt == "csv" else _ndjson_records(file)
+    report = _ImportReport()
+    batch: List[Tuple[int, dict]] = []
+    async for line_no, record, error in records:
+        if error is not None:
+            report.fail(line_no, error)
+            continue
+        try:
+            row = model.model_validate(record).model_dump()
+        except ValidationError as e:
+            report.fail(line_no, _validation_message(e))
+            continue
+        batch.append((line_no, row))
+        if len(batch) >= BULK_IMPORT_CHUNK_ROWS:
+            await _flush(db, table, key, batch, report)
+            batch = []
+    if batch:
+        await _flush(db, table, key, batch, report)
+
+    return {
+        "error": report.failed > 0,
+        "message": f"Imported {report.inserted} rows, {report.skipped} skipped, {report.failed} failed",
+        "inserted": report.inserted,
+        "skipped": report.skipped,
+        "failed": report.failed,
+        "errors": report.errors,
+    }
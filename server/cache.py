@@ -0,0 +1,154 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Set
+
+import coordinator
+from coordinator import CoordinatorUnavailable, MessageTooLarge
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Small in-process LRU cache with a per-entry TTL and hit/miss counters."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key, _MISSING)
+        if item is _MISSING:
+            self.misses += 1
+            return default
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.pop(key, _MISSING)
+        return default if item is _MISSING else item[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class SharedTTLCache(TTLCache):
+    """TTLCache backed by the coordinator's store, so an entry filled by one worker serves all.
+
+    ``get``/``set`` stay local and synchronous; ``fetch`` falls through to the
+    shared store on a local miss and ``store`` writes to both. Keys must be
+    JSON-serialisable (tuples become lists) and so must values that are shared.
+    """
+
+    def __init__(self, namespace: str, maxsize: int, ttl: float):
+        super().__init__(maxsize, ttl)
+        self.namespace = namespace
+        self.shared_hits = 0
+        # Entries too big to send to the coordinator; they are cached in this worker only
+        self.unshared = 0
+        self._writes: Set[asyncio.Future] = set()
+
+    def _shared_key(self, key: Hashable) -> str:
+        return f"{self.namespace}:{json.dumps(key, separators=(',', ':'))}"
+
+    async def fetch(self, key: Hashable, default: Any = None) -> Any:
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        client = coordinator.get_client()
+        if client is None:
+            return default
+        try:
+            reply = await client.call("get", key=self._shared_key(key))
+        except CoordinatorUnavailable:
+            return default
+        if not reply["hit"]:
+            return default
+        self.shared_hits += 1
+        super().set(key, reply["value"], ttl=reply["ttl"])
+        return reply["value"]
+
+    def store(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Cache locally now and publish to the other workers in the background."""
+        self.set(key, value, ttl)
+        client = coordinator.get_client()
+        if client is None:
+            return
+
+        async def publish():
+            try:
+                await client.call("set", key=self._shared_key(key), value=value, ttl=self.ttl if ttl is None else ttl)
+            except MessageTooLarge:
+                self.unshared += 1
+            except CoordinatorUnavailable:
+                pass
+
+        task = asyncio.ensure_future(publish())
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "shared_hits": self.shared_hits, "unshared": self.unshared}
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one in-flight task."""
+
+    def __init__(self):
+        self._inflight: dict = {}
+
+    async def do(self, key: Hashable, fn):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # Shield so one caller disconnecting doesn't cancel the call for everyone else
+        return await asyncio.shield(task)
+
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    async def wait_idle(self, timeout: float) -> int:
+        """Wait up to ``timeout`` seconds for in-flight calls to finish; returns how many are left."""
+        tasks = list(self._inflight.values())
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+        return self.inflight()
+
+    def _forget(self, key: Hashable, task: "asyncio.Future"):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every waiter has gone away
+            task.exception()
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import time
+from typing import Any, Iterable, List, Optional, Set
+
+from postgrest import AsyncPostgrestClient
+
+import coordinator
+import metrics
+from cache import TTLCache
+from coordinator import CoordinatorUnavailable
+
+CATALOG_CACHE_TTL_S = float(os.getenv("CATALOG_CACHE_TTL_S", "300"))
+CATALOG_CACHE_MAXSIZE = int(os.getenv("CATALOG_CACHE_MAXSIZE", "1024"))
+# How often a worker asks the coordinator whether another worker changed a table
+CATALOG_VERSION_CHECK_S = float(os.getenv("CATALOG_VERSION_CHECK_S", "0.25"))
+
+_ALL = ("*",)
+
+
+class CatalogCache:
+    """Read-through cache of a small, rarely changing table (branch, subject).
+
+    The whole table is loaded with one ``select("*")`` and bucketed by primary
+    key and by each secondary index field, so filtered lookups are served from
+    memory. Buckets live in a TTL/LRU cache; if one is evicted while the full
+    snapshot is still fresh it is rebuilt from the snapshot instead of the DB.
+
+    With several workers, ``invalidate`` also bumps a version on the
+    coordinator. Reads start a background check of that version at most every
+    CATALOG_VERSION_CHECK_S and never wait on it, so a write through one
+    worker drops the cached table in all of them within that interval.
+    """
+
+    def __init__(self, table: str, key: str, indexes: Iterable[str] = (),
+                 ttl: float = CATALOG_CACHE_TTL_S, maxsize: int = CATALOG_CACHE_MAXSIZE):
+        self.table = table
+        self.key = key
+        self.fields = (key, *indexes)
+        self.hits = 0
+        self.misses = 0
+        self._entries = TTLCache(maxsize, ttl)
+        self._load_lock = asyncio.Lock()
+        self._generation = 0
+        self._shared_version: Optional[int] = None
+        self._bumps: Set[asyncio.Future] = set()
+        self._next_check = 0.0
+        self._checking: Optional[asyncio.Future] = None
+
+    async def all(self, db: AsyncPostgrestClient) -> List[dict]:
+        self._schedule_sync()
+        rows = self._entries.get(_ALL)
+        if rows is not None:
+            self.hits += 1
+            return rows
+        self.misses += 1
+        return await self._load(db)
+
+    async def lookup(self, db: AsyncPostgrestClient, field: str, value: Any) -> List[dict]:
+        if field not in self.fields:
+            raise KeyError(f"{self.table} has no cached index on {field!r}")
+        self._schedule_sync()
+        rows = self._entries.get((field, value))
+        if rows is not None:
+            self.hits += 1
+            return rows
+        snapshot = self._entries.get(_ALL)
+        if snapshot is not None:
+            self.hits += 1
+            rows = [row for row in snapshot if row.get(field) == value]
+            self._entries.set((field, value), rows)
+            return rows
+        self.misses += 1
+        rows = await self._load(db)
+        return [row for row in rows if row.get(field) == value]
+
+    def invalidate(self):
+        self._generation += 1
+        self._entries.clear()
+        client = coordinator.get_client()
+        if client is not None:
+            task = asyncio.ensure_future(self._bump(client))
+            self._bumps.add(task)
+            task.add_done_callback(self._bumps.discard)
+
+    async def _bump(self, client: coordinator.CoordinatorClient):
+        try:
+            version = (await client.call("bump", name=f"catalog:{self.table}"))["version"]
+        except CoordinatorUnavailable:
+            return
+        if self._shared_version is not None and version == self._shared_version + 1:
+            # Only our own write happened since the last check; nothing else to drop
+            self._shared_version = version
+
+    def _schedule_sync(self):
+        """Start a version check if one is due; reads are served from memory meanwhile."""
+        client = coordinator.get_client()
+        if client is None or self._checking is not None:
+            return
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + CATALOG_VERSION_CHECK_S
+        self._checking = asyncio.ensure_future(self._sync(client))
+        self._checking.add_done_callback(self._sync_done)
+
+    def _sync_done(self, task: asyncio.Future):
+        self._checking = None
+        if not task.cancelled():
+            task.exception()
+
+    async def _sync(self, client: coordinator.CoordinatorClient):
+        """Drop cached rows if another worker changed the table since the last check."""
+        try:
+            version = (await client.call("version", name=f"catalog:{self.table}"))["version"]
+        except CoordinatorUnavailable:
+            return
+        if version != self._shared_version:
+            self._shared_version = version
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "table": self.table,
+            "entries": len(self._entries),
+            "maxsize": self._entries.maxsize,
+            "ttl": self._entries.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    async def _load(self, db: AsyncPostgrestClient) -> List[dict]:
+        async with self._load_lock:
+            # Another request may have filled the cache while we waited
+            rows = self._entries.get(_ALL)
+            if rows is not None:
+                return rows
+            generation = self._generation
+            response = await db.table(self.table).select("*").execute()
+            rows = response.data or []
+            # Don't cache a snapshot that a concurrent write has already made stale
+            if generation == self._generation:
+                self._store(rows)
+            return rows
+
+    def _store(self, rows: List[dict]):
+        buckets: dict = {}
+        for row in rows:
+            for field in self.fields:
+                buckets.setdefault((field, row.get(field)), []).append(row)
+        self._entries.clear()
+        for bucket_key, bucket in buckets.items():
+            self._entries.set(bucket_key, bucket)
+        # Set last so the snapshot is the most recently used entry
+        self._entries.set(_ALL, rows)
+
+
+branch_cache = CatalogCache("branch", "branch_id")
+subject_cache = CatalogCache("subject", "subject_id", indexes=("branch_id", "sem"))
+
+metrics.register_cache("catalog_branch", branch_cache.stats)
+metrics.register_cache("catalog_subject", subject_cache.stats)
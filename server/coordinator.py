@@ -0,0 +1,255 @@
+"""State shared by the worker processes of one server, over a local Unix socket.
+
+serve.py runs a Coordinator in the supervisor process and hands its socket
+path to the workers in COORDINATOR_SOCKET. It holds the token buckets that
+enforce upstream quotas across all workers, a small TTL/LRU key-value store
+for hot caches, and version counters used to invalidate per-worker caches.
+The protocol is one JSON object per line in each direction.
+
+Without COORDINATOR_SOCKET (a single ``uvicorn main:app`` process)
+``get_client()`` returns None and callers keep their state in-process.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+COORDINATOR_SOCKET = os.getenv("COORDINATOR_SOCKET")
+COORDINATOR_TIMEOUT_S = float(os.getenv("COORDINATOR_TIMEOUT_S", "1.0"))
+COORDINATOR_CACHE_MAXSIZE = int(os.getenv("COORDINATOR_CACHE_MAXSIZE", "10000"))
+# Largest request a client sends; bigger values stay in the worker that made them
+COORDINATOR_MAX_MESSAGE_BYTES = int(os.getenv("COORDINATOR_MAX_MESSAGE_BYTES", str(1024 * 1024)))
+# Line limit for both ends, with room for the fields a reply adds around a stored value
+_STREAM_LIMIT = COORDINATOR_MAX_MESSAGE_BYTES + 64 * 1024
+
+
+class CoordinatorUnavailable(Exception):
+    """The coordinator could not be reached; callers fall back to per-worker state."""
+
+
+class MessageTooLarge(CoordinatorUnavailable):
+    """The request is over COORDINATOR_MAX_MESSAGE_BYTES and was not sent."""
+
+
+# ---------------------------------------------------------------- server
+
+class _Bucket:
+    def __init__(self, capacity: float, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def take(self) -> float:
+        """Take a token and return 0, or return the seconds until one is available."""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def backoff(self, seconds: float):
+        self.tokens = 0.0
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.updated = self.paused_until
+
+
+class Coordinator:
+    def __init__(self, cache_maxsize: int = COORDINATOR_CACHE_MAXSIZE):
+        self.cache_maxsize = cache_maxsize
+        self._buckets: Dict[str, _Bucket] = {}
+        self._store: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+
+    def _bucket(self, msg: dict) -> _Bucket:
+        bucket = self._buckets.get(msg["bucket"])
+        if bucket is None:
+            bucket = self._buckets[msg["bucket"]] = _Bucket(msg["capacity"], msg["period"])
+        return bucket
+
+    def handle(self, msg: dict) -> dict:
+        op = msg.get("op")
+        if op == "take":
+            bucket = self._bucket(msg)
+            return {"wait": bucket.take(), "tokens": bucket.tokens}
+        if op == "give_back":
+            bucket = self._bucket(msg)
+            bucket.tokens = min(bucket.capacity, bucket.tokens + 1)
+            return {"tokens": bucket.tokens}
+        if op == "backoff":
+            self._bucket(msg).backoff(msg["seconds"])
+            return {}
+        if op == "get":
+            item = self._store.get(msg["key"])
+            if item is None or item[0] <= time.monotonic():
+                self._store.pop(msg["key"], None)
+                return {"hit": False}
+            self._store.move_to_end(msg["key"])
+            return {"hit": True, "value": item[1], "ttl": item[0] - time.monotonic()}
+        if op == "set":
+            self._store[msg["key"]] = (time.monotonic() + msg["ttl"], msg["value"])
+            self._store.move_to_end(msg["key"])
+            while len(self._store) > self.cache_maxsize:
+                self._store.popitem(last=False)
+            return {}
+        if op == "delete":
+            self._store.pop(msg["key"], None)
+            return {}
+        if op == "version":
+            return {"version": self._versions.get(msg["name"], 0)}
+        if op == "bump":
+            self._versions[msg["name"]] = self._versions.get(msg["name"], 0) + 1
+            return {"version": self._versions[msg["name"]]}
+        if op == "stats":
+            return {
+                "buckets": {
+                    name: {"capacity": b.capacity, "tokens": round(b.tokens, 3)} for name, b in self._buckets.items()
+                },
+                "entries": len(self._store),
+                "versions": dict(self._versions),
+            }
+        return {"error": f"unknown op {op!r}"}
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = self.handle(json.loads(line))
+                except Exception as e:
+                    reply = {"error": repr(e)}
+                writer.write(json.dumps(reply, separators=(",", ":")).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        except ValueError:
+            # A line over the limit; the stream can't be resynchronised, so drop the connection
+            logger.warning("coordinator request over the size limit, closing connection", extra={"limit": _STREAM_LIMIT})
+        finally:
+            writer.close()
+
+
+class CoordinatorThread(threading.Thread):
+    """Runs a Coordinator on its own event loop, listening on a Unix socket at ``path``."""
+
+    def __init__(self, path: str, coordinator: Optional[Coordinator] = None):
+        super().__init__(name="coordinator", daemon=True)
+        self.path = path
+        self.coordinator = coordinator or Coordinator()
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._stopped: Optional[asyncio.Event] = None
+
+    def run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._main())
+
+    async def _main(self):
+        self._stopped = asyncio.Event()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self.coordinator.serve_connection, path=self.path, limit=_STREAM_LIMIT)
+        self._ready.set()
+        async with server:
+            await self._stopped.wait()
+
+    def start(self):
+        super().start()
+        self._ready.wait()
+
+    def stop(self):
+        if self._stopped is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+        self.join(timeout=5)
+
+
+# ---------------------------------------------------------------- client
+
+class CoordinatorClient:
+    """One connection per worker; requests are serialised on it, each a single round trip."""
+
+    def __init__(self, path: str, timeout: float = COORDINATOR_TIMEOUT_S):
+        self.path = path
+        self.timeout = timeout
+        self._lock = asyncio.Lock()
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._failed = False
+
+    async def call(self, op: str, **args) -> dict:
+        line = json.dumps({"op": op, **args}, separators=(",", ":")).encode() + b"\n"
+        if len(line) > COORDINATOR_MAX_MESSAGE_BYTES:
+            raise MessageTooLarge(f"{op} request is {len(line)} bytes")
+        async with self._lock:
+            try:
+                reply = await asyncio.wait_for(self._round_trip(line), self.timeout)
+            except asyncio.CancelledError:
+                # The reply may still arrive; a fresh connection keeps requests and replies paired
+                self._disconnect()
+                raise
+            except (OSError, asyncio.TimeoutError, ValueError) as e:
+                self._disconnect()
+                if not self._failed:
+                    logger.warning("coordinator unavailable, using per-worker state", extra={"error": repr(e)})
+                self._failed = True
+                raise CoordinatorUnavailable(repr(e)) from e
+        if self._failed:
+            logger.info("coordinator reachable again")
+            self._failed = False
+        if "error" in reply:
+            raise CoordinatorUnavailable(reply["error"])
+        return reply
+
+    async def _round_trip(self, line: bytes) -> dict:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_unix_connection(self.path, limit=_STREAM_LIMIT)
+        self._writer.write(line)
+        await self._writer.drain()
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionResetError("coordinator closed the connection")
+        return json.loads(line)
+
+    def _disconnect(self):
+        writer, self._reader, self._writer = self._writer, None, None
+        if writer is not None:
+            writer.close()
+
+    async def close(self):
+        async with self._lock:
+            self._disconnect()
+
+
+_client: Optional[CoordinatorClient] = None
+
+
+def get_client() -> Optional[CoordinatorClient]:
+    """This worker's coordinator client, or None when running as a single process."""
+    global _client
+    if _client is None and COORDINATOR_SOCKET:
+        _client = CoordinatorClient(COORDINATOR_SOCKET)
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,113 @@
+import os
+from typing import List, Optional
+
+import httpx
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+from postgrest.exceptions import APIError
+
+import features
+from metrics import instrumented_transport
+
+# Connection pool sizing for the shared PostgREST client
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "20"))
+DB_MAX_KEEPALIVE = int(os.getenv("DB_MAX_KEEPALIVE", "10"))
+DB_TIMEOUT_S = float(os.getenv("DB_TIMEOUT_S", "10"))
+
+# Postgres SQLSTATE for a unique / primary key violation
+UNIQUE_VIOLATION = "23505"
+
+_client: Optional[AsyncPostgrestClient] = None
+
+database = features.env_feature("database", ("SUPABASE_URL", "SUPABASE_KEY"))
+
+
+class AlreadyExists(Exception):
+    """An insert collided with an existing row on a primary key or unique constraint."""
+
+
+def _operation(request: httpx.Request) -> str:
+    # "GET branch", "POST rpc/mark_attendance"
+    return f"{request.method} {request.url.path.split('/rest/v1/', 1)[-1]}"
+
+
+class _PooledPostgrestClient(AsyncPostgrestClient):
+    """AsyncPostgrestClient whose session is a bounded, keep-alive, instrumented HTTP/2 pool."""
+
+    def create_session(self, base_url, headers, timeout, verify=True, proxy=None):
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            follow_redirects=True,
+            transport=instrumented_transport(
+                "supabase",
+                _operation,
+                verify=verify,
+                proxy=proxy,
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=DB_MAX_CONNECTIONS,
+                    max_keepalive_connections=DB_MAX_KEEPALIVE,
+                ),
+            ),
+        )
+
+
+async def init_db() -> Optional[AsyncPostgrestClient]:
+    """Create the shared Supabase client. Called once from the app lifespan.
+
+    Without SUPABASE_URL / SUPABASE_KEY the app still starts; database-backed
+    endpoints answer 503 until it is configured.
+    """
+    global _client
+    if _client is not None or not database.enabled:
+        return _client
+
+    supabase_url = os.getenv("SUPABASE_URL")
+    supabase_key = os.getenv("SUPABASE_KEY")
+
+    _client = _PooledPostgrestClient(
+        f"{supabase_url}/rest/v1",
+        headers={
+            **DEFAULT_POSTGREST_CLIENT_HEADERS,
+            "apiKey": supabase_key,
+            "Authorization": f"Bearer {supabase_key}",
+        },
+        timeout=DB_TIMEOUT_S,
+    )
+    return _client
+
+
+async def close_db():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_db() -> AsyncPostgrestClient:
+    """FastAPI dependency returning the shared Supabase client."""
+    database.require()
+    if _client is None:
+        raise RuntimeError("Database client is not initialised; is the app lifespan running?")
+    return _client
+
+
+async def insert_unique(db: AsyncPostgrestClient, table: str, row: dict, on_conflict: str) -> List[dict]:
+    """Insert ``row`` in a single round trip and return the inserted rows.
+
+    The database's constraints decide whether the row already exists: a clash on
+    ``on_conflict`` is skipped by PostgREST and comes back empty, and a clash on
+    any other unique constraint comes back as a 23505 error. Both raise
+    AlreadyExists, so there is no select-then-insert race.
+    """
+    try:
+        response = await db.table(table).upsert(row, on_conflict=on_conflict, ignore_duplicates=True).execute()
+    except APIError as e:
+        if e.code == UNIQUE_VIOLATION:
+            raise AlreadyExists(e.message) from e
+        raise
+    if not response.data:
+        raise AlreadyExists(f"{table} row already exists")
+    return response.data
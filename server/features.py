@@ -0,0 +1,54 @@
+import importlib.util
+import os
+from typing import Dict, List, Optional, Sequence, Union
+
+from fastapi import HTTPException
+
+import metrics
+
+_features: List["Feature"] = []
+
+
+class Feature:
+    """An optional integration. When it isn't configured the process still starts;
+    requests that need it get a 503 naming what is missing."""
+
+    def __init__(self, name: str, missing: Optional[str]):
+        self.name = name
+        self.missing = missing
+        _features.append(self)
+
+    @property
+    def enabled(self) -> bool:
+        return self.missing is None
+
+    def require(self):
+        """FastAPI dependency: reject the request if the feature is disabled."""
+        if self.missing is not None:
+            raise HTTPException(status_code=503, detail=f"{self.name} is not configured on this server ({self.missing})")
+
+
+def env_feature(name: str, *alternatives: Union[str, Sequence[str]]) -> Feature:
+    """Enabled when any one alternative is fully set; an alternative is a variable or a tuple of them."""
+    groups = [(alt,) if isinstance(alt, str) else tuple(alt) for alt in alternatives]
+    if any(all(os.getenv(var) for var in group) for group in groups):
+        return Feature(name, None)
+    return Feature(name, "set " + " or ".join(" and ".join(group) for group in groups))
+
+
+def module_feature(name: str, module: str) -> Feature:
+    """Enabled when ``module`` is installed; it is not imported here."""
+    if importlib.util.find_spec(module) is not None:
+        return Feature(name, None)
+    return Feature(name, f"install {module}")
+
+
+def status() -> Dict[str, Optional[str]]:
+    """Feature name -> None if enabled, else what is missing."""
+    return {feature.name: feature.missing for feature in _features}
+
+
+metrics.register_gauge(
+    "feature_enabled", "1 if an optional integration is configured, 0 if it is disabled.",
+    lambda: [({"feature": feature.name}, int(feature.enabled)) for feature in _features],
+)
@@ -0,0 +1,208 @@
+"""Find the JSON value in model output and check it against a JSON schema.
+
+Models wrap JSON in prose or ```json fences and sometimes keep talking after
+it. ``find_json`` takes the first top-level object or array that parses, in
+one pass over complete text; ``JsonScanner`` does the same over a stream, a
+chunk at a time, so a caller can stop reading as soon as the value is closed.
+
+A bracketed span that closes but doesn't parse is skipped whole, never
+searched for values nested inside it, and a top-level value that never
+closes (output cut off by maxOutputTokens) means no JSON was found.
+"""
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+_decoder = json.JSONDecoder()
+_OPENER = re.compile(r"[{\[]")
+# Outside a string only these characters matter for nesting
+_STRUCTURE = re.compile(r'[{}\[\]"]')
+_STRING_END = re.compile(r'["\\]')
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def find_json(text: str) -> Optional[Tuple[str, Any]]:
+    """The first top-level JSON object or array in ``text`` as (source, value).
+
+    Falls back to the whole text when it is a JSON scalar; None if there is
+    no JSON at all or the value is truncated. Bracketed prose before the
+    value is skipped.
+
+    >>> find_json('Here [see note] is it: {"a": [1, 2]} thanks')
+    ('{"a": [1, 2]}', {'a': [1, 2]})
+    >>> find_json('{"questions": [{"q": "2+2?", "answer": [1]}, {"q": "Capital of Fr') is None
+    True
+    >>> find_json('[{"q": "2+2?"}, [1, 2], {"q": "Capi') is None
+    True
+    >>> find_json('(x{]) then {"ok": true}')
+    ('{"ok": true}', {'ok': True})
+    """
+    opener = _OPENER.search(text)
+    if opener is not None:
+        # Usually the first bracket starts the value; parse it at C speed
+        try:
+            value, end = _decoder.raw_decode(text, opener.start())
+            return text[opener.start():end], value
+        except ValueError:
+            pass
+        scanner = JsonScanner()
+        if scanner.feed(text[opener.start():]):
+            return scanner.text, scanner.value
+        if scanner.open:
+            return None
+    stripped = text.strip()
+    try:
+        return stripped, json.loads(stripped)
+    except ValueError:
+        return None
+
+
+class JsonScanner:
+    """Incremental ``find_json`` for objects and arrays: ``feed`` chunks until it returns True.
+
+    Tracks nesting and string state across chunks and keeps only the text of
+    the value being read, then sets ``text`` and ``value`` once it closes.
+    """
+
+    def __init__(self):
+        self.text: Optional[str] = None
+        self.value: Any = None
+        self._buffer = ""
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._stack: List[str] = []
+        self._in_string = False
+
+    @property
+    def done(self) -> bool:
+        return self.text is not None
+
+    def feed(self, chunk: str) -> bool:
+        if self.done:
+            return True
+        text = self._buffer + chunk
+        pos = self._pos
+        while True:
+            if self._start is None:
+                opener = _OPENER.search(text, pos)
+                if opener is None:
+                    self._buffer, self._pos = "", 0
+                    return False
+                self._start, self._stack, pos = opener.start(), [_CLOSERS[opener.group()]], opener.end()
+            elif self._in_string:
+                match = _STRING_END.search(text, pos)
+                if match is None:
+                    pos = len(text)
+                    break
+                if match.group() == "\\":
+                    if match.end() == len(text):
+                        # Wait for the escaped character
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                else:
+                    self._in_string, pos = False, match.end()
+            else:
+                match = _STRUCTURE.search(text, pos)
+                if match is None:
+                    pos = len(text)
+                    break
+                ch, pos = match.group(), match.end()
+                if ch == '"':
+                    self._in_string = True
+                elif ch in _CLOSERS:
+                    self._stack.append(_CLOSERS[ch])
+                elif ch != self._stack.pop():
+                    self._restart()
+                elif not self._stack:
+                    try:
+                        self.value, end = _decoder.raw_decode(text, self._start)
+                    except ValueError:
+                        self._restart()
+                        continue
+                    self.text = text[self._start:end]
+                    self._buffer = ""
+                    return True
+        # Only the open value is kept between chunks
+        self._buffer, self._pos, self._start = text[self._start:], pos - self._start, 0
+        return False
+
+    @property
+    def open(self) -> bool:
+        """True while a value has started and not yet closed, e.g. when output was cut off."""
+        return self.text is None and self._start is not None
+
+    def _restart(self):
+        """Drop a false start (bracketed prose) and resume after it, not inside it."""
+        self._start, self._stack, self._in_string = None, [], False
+
+
+_TYPES = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: (isinstance(v, int) and not isinstance(v, bool)) or (isinstance(v, float) and v.is_integer()),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+
+def schema_errors(value: Any, schema: dict, path: str = "$") -> List[str]:
+    """Where ``value`` breaks ``schema``, as "path: problem" strings; empty if it conforms.
+
+    Covers the keywords used to describe model output: type, enum, const,
+    properties, required, additionalProperties, items, minItems, maxItems,
+    minLength, maxLength, minimum, maximum and anyOf. Others are ignored.
+    """
+    if not isinstance(schema, dict):
+        return []
+    types = schema.get("type")
+    if types is not None:
+        types = [types] if isinstance(types, str) else types
+        if not any(_TYPES.get(t, lambda v: True)(value) for t in types):
+            return [f"{path}: expected {' or '.join(types)}, got {_type_name(value)}"]
+    if "const" in schema and value != schema["const"]:
+        return [f"{path}: must be {json.dumps(schema['const'])}"]
+    if "enum" in schema and value not in schema["enum"]:
+        return [f"{path}: must be one of {json.dumps(schema['enum'])}"]
+    if "anyOf" in schema and all(schema_errors(value, option, path) for option in schema["anyOf"]):
+        return [f"{path}: does not match any allowed shape"]
+
+    errors = []
+    if isinstance(value, dict):
+        properties = schema.get("properties") or {}
+        errors += [f"{path}: missing required key {json.dumps(key)}" for key in schema.get("required", ()) if key not in value]
+        for key, item in value.items():
+            if key in properties:
+                errors += schema_errors(item, properties[key], f"{path}.{key}")
+            elif schema.get("additionalProperties") is False:
+                errors.append(f"{path}: unexpected key {json.dumps(key)}")
+            elif isinstance(schema.get("additionalProperties"), dict):
+                errors += schema_errors(item, schema["additionalProperties"], f"{path}.{key}")
+    elif isinstance(value, list):
+        if "minItems" in schema and len(value) < schema["minItems"]:
+            errors.append(f"{path}: needs at least {schema['minItems']} items, got {len(value)}")
+        if "maxItems" in schema and len(value) > schema["maxItems"]:
+            errors.append(f"{path}: allows at most {schema['maxItems']} items, got {len(value)}")
+        if isinstance(schema.get("items"), dict):
+            for i, item in enumerate(value):
+                errors += schema_errors(item, schema["items"], f"{path}[{i}]")
+    elif isinstance(value, str):
+        if "minLength" in schema and len(value) < schema["minLength"]:
+            errors.append(f"{path}: must be at least {schema['minLength']} characters")
+        if "maxLength" in schema and len(value) > schema["maxLength"]:
+            errors.append(f"{path}: must be at most {schema['maxLength']} characters")
+    elif _TYPES["number"](value):
+        if "minimum" in schema and value < schema["minimum"]:
+            errors.append(f"{path}: must be >= {schema['minimum']}")
+        if "maximum" in schema and value > schema["maximum"]:
+            errors.append(f"{path}: must be <= {schema['maximum']}")
+    return errors
+
+
+def _type_name(value: Any) -> str:
+    for name in ("null", "boolean", "integer", "number", "string", "array", "object"):
+        if _TYPES[name](value):
+            return name
+    return type(value).__name__
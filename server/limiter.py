@@ -0,0 +1,244 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Hashable, Optional, Set
+
+import coordinator
+from coordinator import CoordinatorUnavailable
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+
+class LimiterRejected(Exception):
+    """Raised when a caller's deadline would pass before it could be served."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limit queue wait of {retry_after:.1f}s exceeds the request deadline")
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("caller", "priority", "enqueued_at", "future")
+
+    def __init__(self, caller: Hashable, priority: int, enqueued_at: float):
+        self.caller = caller
+        self.priority = priority
+        self.enqueued_at = enqueued_at
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class FairTokenBucket:
+    """Token bucket that hands tokens to queued callers by priority, then round-robin.
+
+    Tokens refill continuously at ``capacity / period`` per second, so an idle
+    bucket lets a burst of up to ``capacity`` calls through immediately. Once
+    callers have to queue, lower priority numbers are served first and callers
+    within a priority take turns, so one heavy user cannot starve the rest.
+    """
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._queues: Dict[int, "OrderedDict[Hashable, Deque[_Waiter]]"] = {}
+        self._depth = 0
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.granted = 0
+        self.rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    async def acquire(self, caller: Hashable, priority: int = PRIORITY_INTERACTIVE,
+                      deadline: Optional[float] = None) -> float:
+        """Wait for a token. ``deadline`` is a time.monotonic() value; returns seconds waited."""
+        if self._depth == 0 and await self._take() == 0:
+            self._record_grant(0.0)
+            return 0.0
+
+        now = time.monotonic()
+        estimate = self.estimate_wait(caller, priority, now)
+        if deadline is not None and now + estimate > deadline:
+            self.rejected += 1
+            raise LimiterRejected(estimate)
+
+        waiter = _Waiter(caller, priority, now)
+        self._queues.setdefault(priority, OrderedDict()).setdefault(caller, deque()).append(waiter)
+        self._depth += 1
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+        timeout = None if deadline is None else max(0.0, deadline - now)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            if not waiter.future.done():
+                self._remove(waiter)
+                self.rejected += 1
+                raise LimiterRejected(self.estimate_wait(caller, priority, time.monotonic()))
+        except asyncio.CancelledError:
+            if waiter.future.done():
+                # Granted just as the caller went away; hand the token back
+                self._give_back()
+            else:
+                self._remove(waiter)
+            raise
+        return time.monotonic() - waiter.enqueued_at
+
+    def backoff(self, seconds: float):
+        """Stop granting for ``seconds`` and drain the bucket, e.g. after an upstream 429."""
+        resume_at = time.monotonic() + seconds
+        self._tokens = 0.0
+        self._paused_until = max(self._paused_until, resume_at)
+        self._updated = self._paused_until
+
+    def estimate_wait(self, caller: Hashable, priority: int, now: Optional[float] = None) -> float:
+        """Rough seconds until a new request from ``caller`` at ``priority`` would be granted."""
+        now = time.monotonic() if now is None else now
+        ahead = sum(len(q) for p, callers in self._queues.items() if p < priority for q in callers.values())
+        same = self._queues.get(priority, {})
+        mine = len(same.get(caller, ()))
+        ahead += mine + sum(min(len(q), mine + 1) for c, q in same.items() if c != caller)
+        pause = max(0.0, self._paused_until - now)
+        return pause + max(0.0, ahead + 1 - self._tokens) / self.rate
+
+    def stats(self) -> dict:
+        self._refill(time.monotonic())
+        return {
+            "capacity": self.capacity,
+            "tokens": round(self._tokens, 3),
+            "queue_depth": self._depth,
+            "queue_depth_by_priority": {
+                p: sum(len(q) for q in callers.values()) for p, callers in self._queues.items()
+            },
+            "waiting_callers": sum(len(callers) for callers in self._queues.values()),
+            "granted": self.granted,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(1000 * self._total_wait / self.granted, 1) if self.granted else 0.0,
+            "max_wait_ms": round(1000 * self._max_wait, 1),
+        }
+
+    async def _take(self) -> float:
+        """Take a token and return 0, or return the seconds until one is available."""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._refill(now)
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def _give_back(self):
+        self._tokens = min(self.capacity, self._tokens + 1)
+
+    def _refill(self, now: float):
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def _record_grant(self, waited: float):
+        self.granted += 1
+        self._total_wait += waited
+        self._max_wait = max(self._max_wait, waited)
+
+    def _remove(self, waiter: _Waiter):
+        callers = self._queues.get(waiter.priority)
+        queue = callers.get(waiter.caller) if callers else None
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        self._depth -= 1
+        if not queue:
+            del callers[waiter.caller]
+            if not callers:
+                del self._queues[waiter.priority]
+
+    def _next_waiter(self) -> _Waiter:
+        priority = min(self._queues)
+        callers = self._queues[priority]
+        caller, queue = next(iter(callers.items()))
+        waiter = queue.popleft()
+        self._depth -= 1
+        if queue:
+            callers.move_to_end(caller)
+        else:
+            del callers[caller]
+            if not callers:
+                del self._queues[priority]
+        return waiter
+
+    async def _dispatch(self):
+        try:
+            while self._depth:
+                wait = await self._take()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                if not self._depth:
+                    # Every waiter gave up while the token was being taken
+                    self._give_back()
+                    break
+                waiter = self._next_waiter()
+                waiter.future.set_result(None)
+                self._record_grant(time.monotonic() - waiter.enqueued_at)
+        finally:
+            self._dispatcher = None
+
+
+class SharedTokenBucket(FairTokenBucket):
+    """FairTokenBucket whose tokens come from bucket ``name`` on the coordinator,
+    so all worker processes together stay within one quota.
+
+    Priorities and per-caller turns still order the callers queued in this
+    worker; across workers a token goes to whichever asks first once it has
+    refilled. A 429 back-off pauses every worker. Running as a single process,
+    or while the coordinator is unreachable, the local bucket is used.
+    """
+
+    def __init__(self, name: str, capacity: int, period: float):
+        super().__init__(capacity, period)
+        self.name = name
+        self._notifications: Set[asyncio.Future] = set()
+
+    async def _take(self) -> float:
+        client = coordinator.get_client()
+        if client is None:
+            return await super()._take()
+        try:
+            reply = await client.call("take", bucket=self.name, capacity=self.capacity, period=self.period)
+        except CoordinatorUnavailable:
+            return await super()._take()
+        # Mirror the shared count so stats() and estimate_wait() reflect it
+        self._tokens = reply["tokens"]
+        self._updated = time.monotonic()
+        return reply["wait"]
+
+    def _give_back(self):
+        super()._give_back()
+        self._notify("give_back")
+
+    def backoff(self, seconds: float):
+        super().backoff(seconds)
+        self._notify("backoff", seconds=seconds)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "shared": coordinator.get_client() is not None}
+
+    def _notify(self, op: str, **args):
+        client = coordinator.get_client()
+        if client is None:
+            return
+
+        async def send():
+            try:
+                await client.call(op, bucket=self.name, capacity=self.capacity, period=self.period, **args)
+            except CoordinatorUnavailable:
+                pass
+
+        task = asyncio.ensure_future(send())
+        self._notifications.add(task)
+        task.add_done_callback(self._notifications.discard)
@@ -0,0 +1,133 @@
+import base64
+import json
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import Query
+from fastapi.responses import StreamingResponse
+from postgrest import AsyncPostgrestClient
+
+LIST_MAX_LIMIT = int(os.getenv("LIST_MAX_LIMIT", "1000"))
+LIST_DEFAULT_LIMIT = int(os.getenv("LIST_DEFAULT_LIMIT", "100"))
+LIST_STREAM_PAGE_SIZE = int(os.getenv("LIST_STREAM_PAGE_SIZE", "500"))
+
+_START = object()
+
+
+class ListParams:
+    """Opt-in paging query parameters shared by the list endpoints.
+
+    ``limit``/``cursor`` page through the rows in key order, ``fields`` is a
+    comma-separated column projection and ``stream`` switches the response to
+    NDJSON, one row per line. With none of them set the endpoint behaves as before.
+    """
+
+    def __init__(self, limit: Optional[int] = Query(None, ge=1, le=LIST_MAX_LIMIT),
+                 cursor: Optional[str] = None, fields: Optional[str] = None, stream: bool = False):
+        self.limit = limit
+        self.cursor = cursor
+        self.fields = fields
+        self.stream = stream
+
+    @property
+    def requested(self) -> bool:
+        return self.limit is not None or self.cursor is not None or self.fields is not None or self.stream
+
+
+class KeysetListing:
+    """Keyset-paginated, column-projected reads of one table, ordered by ``key``.
+
+    Each page is a single ``key > last_seen ORDER BY key LIMIT n`` query, so
+    deep pages cost the same as the first one. The cursor handed back to the
+    client is an opaque token carrying the last key it has seen.
+    """
+
+    def __init__(self, table: str, key: str, columns: Sequence[str]):
+        self.table = table
+        self.key = key
+        self.columns = tuple(columns)
+
+    def encode_cursor(self, value: Any) -> str:
+        raw = json.dumps([self.table, self.key, value], separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode_cursor(self, cursor: Optional[str]) -> Any:
+        if cursor is None:
+            return _START
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            table, key, value = json.loads(raw)
+        except (ValueError, TypeError):
+            raise ValueError("Invalid cursor")
+        if (table, key) != (self.table, self.key):
+            raise ValueError("Cursor belongs to a different listing")
+        return value
+
+    def project(self, fields: Optional[str]) -> List[str]:
+        if fields is None:
+            return list(self.columns)
+        wanted = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+        unknown = [f for f in wanted if f not in self.columns]
+        if unknown or not wanted:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}; choose from {', '.join(self.columns)}")
+        return wanted
+
+    async def page(self, db: AsyncPostgrestClient, params: ListParams,
+                   filters: Dict[str, Any]) -> Tuple[List[dict], Optional[str]]:
+        """Fetch one page; returns the rows and the cursor for the next page (None at the end)."""
+        fields = self.project(params.fields)
+        after = self.decode_cursor(params.cursor)
+        limit = params.limit or LIST_DEFAULT_LIMIT
+        # Ask for one extra row to learn whether another page exists
+        rows = await self._fetch(db, fields, filters, after, limit + 1)
+        more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = self.encode_cursor(rows[-1][self.key]) if more else None
+        return self._strip(rows, fields), next_cursor
+
+    def stream(self, db: AsyncPostgrestClient, params: ListParams, filters: Dict[str, Any]) -> StreamingResponse:
+        """NDJSON export that walks the keyset a page at a time instead of loading every row."""
+        fields = self.project(params.fields)
+        after = self.decode_cursor(params.cursor)
+        return StreamingResponse(self._ndjson(db, fields, filters, after, params.limit),
+                                 media_type="application/x-ndjson")
+
+    async def respond(self, db: AsyncPostgrestClient, params: ListParams, filters: Dict[str, Any], message: str):
+        if params.stream:
+            return self.stream(db, params, filters)
+        rows, next_cursor = await self.page(db, params, filters)
+        return {"error": False, "message": message, "data": rows, "next_cursor": next_cursor}
+
+    async def _ndjson(self, db: AsyncPostgrestClient, fields: List[str], filters: Dict[str, Any],
+                      after: Any, limit: Optional[int]) -> AsyncIterator[str]:
+        remaining = limit
+        try:
+            while remaining is None or remaining > 0:
+                size = LIST_STREAM_PAGE_SIZE if remaining is None else min(remaining, LIST_STREAM_PAGE_SIZE)
+                rows = await self._fetch(db, fields, filters, after, size)
+                for row in self._strip(rows, fields):
+                    yield json.dumps(row) + "\n"
+                if len(rows) < size:
+                    break
+                after = rows[-1][self.key]
+                if remaining is not None:
+                    remaining -= len(rows)
+        except Exception as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    async def _fetch(self, db: AsyncPostgrestClient, fields: List[str], filters: Dict[str, Any],
+                     after: Any, limit: int) -> List[dict]:
+        # The key is always selected so the next page can be located
+        columns = fields if self.key in fields else [*fields, self.key]
+        query = db.table(self.table).select(",".join(columns))
+        for column, value in filters.items():
+            query = query.eq(column, value)
+        if after is not _START:
+            query = query.gt(self.key, after)
+        response = await query.order(self.key).limit(limit).execute()
+        return response.data or []
+
+    def _strip(self, rows: List[dict], fields: List[str]) -> List[dict]:
+        if self.key in fields:
+            return rows
+        return [{f: row.get(f) for f in fields} for row in rows]
@@ -1,21 +1,67 @@
-import os
+import importlib
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+# Settings must be in the environment before any router reads them at import
+load_dotenv()
+
+import startup
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
+from db import init_db, close_db
+from auth import shutdown_hash_pool
+from coordinator import close_client as close_coordinator_client
+from responses import FastJSONResponse
+from compression import CompressionMiddleware
+from metrics import MetricsMiddleware
+from logconfig import configure_logging
+import pdftext
 
-from routes.authRoute import router as auth_router
-from routes.liveblocksRoute import router as liveblocks_router
-# from routes.atsRoute import router as ats_router 
-from routes.atsRoute import router as extract_router
-from routes.genaiRoute import router as genai_router
-from routes.quizRoute import router as quiz_router
-from routes.userSubjectRoute import router as user_subject_router
-from routes.branchRoute import router as branch_router
-from routes.subjectRoute import router as subject_router
-from routes.classroomRoute import router as classroom_router
+configure_logging()
 
-load_dotenv()
-app = FastAPI()
+# (module, prefix) for every router, mounted in this order
+ROUTERS = [
+    ("routes.authRoute", "/auth"),
+    ("routes.liveblocksRoute", "/liveblocks"),
+    ("routes.atsScoreRoute", "/ats"),
+    ("routes.atsRoute", "/pdf"),
+    ("routes.genaiRoute", "/genai"),
+    ("routes.quizRoute", "/quiz"),
+    ("routes.userSubjectRoute", "/user-subject"),
+    ("routes.studentSubjectRoute", "/student-subject"),
+    ("routes.branchRoute", "/branch"),
+    ("routes.subjectRoute", "/subject"),
+    ("routes.classroomRoute", "/classroom"),
+    ("routes.metricsRoute", "/metrics"),
+]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with startup.timed("db", "init"):
+        await init_db()
+    startup.log_report()
+    yield
+    # In-flight requests have finished (or timed out) by now; let detached upstream work wrap up
+    for module in _router_modules:
+        drain = getattr(module, "drain", None)
+        if drain is not None:
+            await drain()
+    # Routers create their upstream clients on first use and close them here
+    for module in _router_modules:
+        close_http_client = getattr(module, "close_http_client", None)
+        if close_http_client is not None:
+            await close_http_client()
+    await close_db()
+    await close_coordinator_client()
+    pdftext.shutdown_pool()
+    shutdown_hash_pool()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 allowed_origin = ["*"]
 app.add_middleware(
@@ -27,17 +73,15 @@ app.add_middleware(
 )
 
 
-app.include_router(auth_router, prefix="/auth")
-app.include_router(liveblocks_router, prefix="/liveblocks")
-# app.include_router(ats_router, prefix="/ats")
-app.include_router(extract_router, prefix="/pdf")
-app.include_router(genai_router, prefix="/genai")
-app.include_router(quiz_router, prefix="/quiz")
-app.include_router(user_subject_router, prefix="/user-subject")
-app.include_router(branch_router, prefix="/branch")
-app.include_router(subject_router, prefix="/subject")
-app.include_router(classroom_router, prefix="/classroom")
+_router_modules = []
+for module_name, prefix in ROUTERS:
+    component = module_name.rsplit(".", 1)[-1]
+    with startup.timed(component, "import"):
+        module = importlib.import_module(module_name)
+    with startup.timed(component, "mount"):
+        app.include_router(module.router, prefix=prefix)
+    _router_modules.append(module)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,261 @@
+import bisect
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import httpx
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Each worker process keeps its own registry; this label tells their series apart
+WORKER = str(os.getpid())
+
+_metrics: List["_Metric"] = []
+_collectors: List[Callable[[], List[str]]] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    parts.append(f'worker="{_escape(WORKER)}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        _metrics.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self) -> List[str]:
+        lines = self.header()
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def collect(self) -> List[str]:
+        lines = self.header()
+        for key, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, n in zip((*self.buckets, "+Inf"), counts):
+                cumulative += n
+                le = bound if bound == "+Inf" else _number(float(bound))
+                bucket_labels = _labels(self.labelnames, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+GaugeValue = Union[float, List[Tuple[Dict[str, str], float]]]
+
+
+def register_gauge(name: str, help: str, fn: Callable[[], GaugeValue], kind: str = "gauge"):
+    """Expose a value read at scrape time; ``fn`` returns a number or [(labels, value), ...]."""
+
+    def collect() -> List[str]:
+        value = fn()
+        samples = value if isinstance(value, list) else [({}, value)]
+        lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        for labels, sample in samples:
+            names = tuple(labels)
+            lines.append(f"{name}{_labels(names, [labels[n] for n in names])} {_number(sample)}")
+        return lines
+
+    _collectors.append(collect)
+
+
+_caches: Dict[str, Callable[[], dict]] = {}
+
+
+def register_cache(cache: str, stats: Callable[[], dict]):
+    """Expose hits, misses, hit ratio and size from a cache's ``stats()`` dict."""
+    _caches[cache] = stats
+
+
+def _collect_caches() -> List[str]:
+    snapshots = {cache: stats() for cache, stats in _caches.items()}
+    lines = []
+    for name, kind, help, field in (
+        ("cache_hits_total", "counter", "Cache lookups answered from the cache.", "hits"),
+        ("cache_misses_total", "counter", "Cache lookups that missed.", "misses"),
+        ("cache_hit_ratio", "gauge", "Hits over lookups since start.", "hit_ratio"),
+        ("cache_entries", "gauge", "Entries currently held in memory.", "entries"),
+    ):
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        for cache, snapshot in snapshots.items():
+            if field == "entries":
+                value = snapshot.get("size", snapshot.get("entries", snapshot.get("memory_entries", 0)))
+            else:
+                value = snapshot.get(field, 0)
+            lines.append(f"{name}{_labels(('cache',), (cache,))} {_number(value)}")
+    return lines
+
+
+_collectors.append(_collect_caches)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in _metrics:
+        lines += metric.collect()
+    for collect in _collectors:
+        try:
+            lines += collect()
+        except Exception:
+            logger.exception("metrics collector failed")
+    return "\n".join(lines) + "\n"
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Time to handle an HTTP request, by route template.", ("method", "route", "status")
+)
+upstream_request_duration = Histogram(
+    "upstream_request_duration_seconds",
+    "Time for calls to upstream services (to response headers for HTTP).",
+    ("upstream", "operation"),
+)
+upstream_errors = Counter(
+    "upstream_errors_total", "Upstream calls that raised or returned an error status.", ("upstream", "operation", "kind")
+)
+
+
+@contextmanager
+def track(upstream: str, operation: str):
+    """Time a non-HTTP upstream call (e.g. PDF extraction) and count it if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        upstream_errors.inc(upstream=upstream, operation=operation, kind=type(e).__name__)
+        raise
+    finally:
+        upstream_request_duration.observe(time.perf_counter() - start, upstream=upstream, operation=operation)
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """httpx transport that times every request and counts and logs failures."""
+
+    def __init__(self, upstream: str, inner: httpx.AsyncBaseTransport,
+                 operation: Optional[Callable[[httpx.Request], str]] = None):
+        self.upstream = upstream
+        self._inner = inner
+        self._operation = operation or (lambda request: request.method)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        operation = self._operation(request)
+        start = time.perf_counter()
+        try:
+            response = await self._inner.handle_async_request(request)
+        except Exception as e:
+            upstream_errors.inc(upstream=self.upstream, operation=operation, kind=type(e).__name__)
+            logger.warning("upstream request failed", extra={
+                "upstream": self.upstream, "operation": operation, "error": repr(e),
+            })
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            upstream_request_duration.observe(elapsed, upstream=self.upstream, operation=operation)
+        if response.status_code >= 400:
+            upstream_errors.inc(upstream=self.upstream, operation=operation, kind=str(response.status_code))
+            logger.warning("upstream returned an error status", extra={
+                "upstream": self.upstream, "operation": operation, "status": response.status_code,
+                "duration_ms": round(elapsed * 1000, 1),
+            })
+        return response
+
+    async def aclose(self):
+        await self._inner.aclose()
+
+
+def instrumented_transport(upstream: str, operation: Optional[Callable[[httpx.Request], str]] = None,
+                           **transport_kwargs) -> InstrumentedTransport:
+    """An instrumented httpx.AsyncHTTPTransport; ``transport_kwargs`` go to the real transport."""
+    return InstrumentedTransport(upstream, httpx.AsyncHTTPTransport(**transport_kwargs), operation)
+
+
+class MetricsMiddleware:
+    """Records http_request_duration_seconds for every request, labelled by route template."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Use the template, not the raw path, to keep label cardinality bounded
+            http_request_duration.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status),
+            )
@@ -1 +1 @@
-from .userModel import userReqMod,userResMod,loginReqMod
\ No newline at end of file
+from .userModel import userReqMod,userResMod,loginReqMod,refreshReqMod
\ No newline at end of file
@@ -0,0 +1,19 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+class atsJobReqMod(BaseModel):
+    job_description: str = Field(min_length=1)
+    keywords: Optional[List[str]] = None
+
+class atsJobResMod(BaseModel):
+    error: bool
+    message: str
+    jd_id: str = ""
+    keywords: List[str] = []
+
+class atsScoreResMod(BaseModel):
+    error: bool
+    message: str
+    jd_id: str = ""
+    keywords: List[str] = []
+    results: List[dict] = []
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 class branchReqMod(BaseModel):
     branch_id: int
@@ -11,4 +11,5 @@ class branchGetReqMod(BaseModel):
 class branchResMod(BaseModel):
     error: bool
     message: str
-    data: List[dict] = []
\ No newline at end of file
+    data: List[dict] = []
+    next_cursor: Optional[str] = None
\ No newline at end of file
@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+from typing import List
+
+class importResMod(BaseModel):
+    error: bool
+    message: str
+    inserted: int = 0
+    skipped: int = 0
+    failed: int = 0
+    errors: List[dict] = []
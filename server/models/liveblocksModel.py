@@ -0,0 +1,7 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class liveblocksAuthReqMod(BaseModel):
+    room: Optional[str] = None
+    # Random id a browser keeps for itself, so reconnects reuse one anonymous identity
+    anonymous_id: Optional[str] = Field(None, pattern=r"^[0-9a-fA-F-]{8,64}$")
@@ -1,14 +1,39 @@
-from pydantic import BaseModel
-from typing import Any
+from pydantic import BaseModel, Field, model_validator
+from typing import Any, List, Optional
+
+class quizQuestionMod(BaseModel):
+    question: str
+    options: List[str] = Field(min_length=2)
+    answer: List[int] = Field(min_length=1)
+    explanation: Optional[str] = None
+    image: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_answer_range(self):
+        if any(a < 0 or a >= len(self.options) for a in self.answer):
+            raise ValueError("answer indexes must point at one of the options")
+        return self
+
+class quizDataMod(BaseModel):
+    title: str = ""
+    description: str = ""
+    timeLimit: int = 30
+    questions: List[quizQuestionMod] = Field(min_length=1)
 
 class quizReqMod(BaseModel):
     quiz_id: int
-    quiz_data: dict
+    quiz_data: quizDataMod
 
 class quizGetReqMod(BaseModel):
     quiz_id: int
+    start: int = Field(0, ge=0)
+    end: Optional[int] = Field(None, ge=0)
+    stems_only: bool = False
+    known_hash: Optional[str] = None
 
 class quizResMod(BaseModel):
     error: bool
     message: str
-    quiz_data: dict = {}
\ No newline at end of file
+    quiz_data: dict = {}
+    content_hash: str = ""
+    not_modified: bool = False
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 class studentSubjectAddReqMod(BaseModel):
@@ -12,7 +12,9 @@ class studentSubjectGetReqMod(BaseModel):
 class studentSubjectUpdateReqMod(BaseModel):
     student_id: str
     subject_id: int
-    attendance: float
+    attendance: float = Field(ge=0, le=100)
+    # Sessions the percentage is over; defaults to the sessions already counted
+    sessions: Optional[int] = Field(None, ge=1)
 
 class studentSubjectDelReqMod(BaseModel):
     student_id: str
@@ -21,4 +23,10 @@ class studentSubjectDelReqMod(BaseModel):
 class studentSubjectResMod(BaseModel):
     error: bool
     message: str
-    data: List[dict] = []
\ No newline at end of file
+    data: List[dict] = []
+    next_cursor: Optional[str] = None
+
+class studentSubjectSessionReqMod(BaseModel):
+    subject_id: int
+    present: List[str] = []
+    absent: List[str] = []
@@ -19,4 +19,5 @@ class subjectGetBySemReqMod(BaseModel):
 class subjectResMod(BaseModel):
     error: bool
     message: str
-    data: List[dict] = []
\ No newline at end of file
+    data: List[dict] = []
+    next_cursor: Optional[str] = None
\ No newline at end of file
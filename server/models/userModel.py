@@ -13,7 +13,11 @@ class loginReqMod(BaseModel):
     email: str
     password: str
 
+class refreshReqMod(BaseModel):
+    refresh_token: str
+
 class userResMod(BaseModel):
     error: bool
     token: str
-    username: str
\ No newline at end of file
+    username: str
+    refresh_token: str = ""
\ No newline at end of file
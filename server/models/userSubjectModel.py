@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 class userSubjectReqMod(BaseModel):
     uid: int
@@ -15,4 +15,5 @@ class userSubjectDelReqMod(BaseModel):
 class userSubjectResMod(BaseModel):
     error: bool
     message: str
-    data: List[dict] = []
\ No newline at end of file
+    data: List[dict] = []
+    next_cursor: Optional[str] = None
\ No newline at end of file
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from fastapi import UploadFile
+
+import metrics
+import pdftext
+
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), "hackbuild-pdf-text"))
+PDF_CACHE_MEMORY_BYTES = int(os.getenv("PDF_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+PDF_CACHE_DISK_BYTES = int(os.getenv("PDF_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+READ_CHUNK_BYTES = 64 * 1024
+
+
+async def read_and_hash(file: UploadFile) -> Tuple[bytes, str]:
+    """Read an upload chunk by chunk, hashing it as it comes in."""
+    digest = hashlib.sha256()
+    data = bytearray()
+    while True:
+        chunk = await file.read(READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        digest.update(chunk)
+        data += chunk
+    return bytes(data), digest.hexdigest()
+
+
+def _pages_size(pages: List[str]) -> int:
+    return sum(len(page) for page in pages) + 64
+
+
+class PdfTextStore:
+    """Content-addressed store of extracted page text, keyed by upload SHA-256.
+
+    A byte-bounded in-memory LRU sits in front of a byte-bounded directory of
+    JSON files. Keys carry ``pdftext.NORMALIZE_VERSION`` so entries written by
+    an older normalization are never served and are purged on first use.
+    """
+
+    def __init__(self, directory: str, memory_bytes: int, disk_bytes: int, version: int):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.prefix = f"v{version}-"
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._memory_size = 0
+        self._disk: Optional["OrderedDict[str, int]"] = None
+        self._disk_size = 0
+        self._index_lock = asyncio.Lock()
+
+    async def get(self, digest: str) -> Optional[List[str]]:
+        pages = self._memory.get(digest)
+        if pages is not None:
+            self._memory.move_to_end(digest)
+            self.hits += 1
+            return pages
+
+        disk = await self._disk_index()
+        if digest in disk:
+            try:
+                pages = await asyncio.to_thread(self._read_file, digest)
+            except (OSError, ValueError):
+                self._forget_file(digest)
+            else:
+                disk.move_to_end(digest)
+                self._remember(digest, pages)
+                self.hits += 1
+                return pages
+
+        self.misses += 1
+        return None
+
+    async def put(self, digest: str, pages: List[str]):
+        self._remember(digest, pages)
+        disk = await self._disk_index()
+        try:
+            size = await asyncio.to_thread(self._write_file, digest, pages)
+        except OSError:
+            return
+        if digest in disk:
+            self._disk_size -= disk[digest]
+        disk[digest] = size
+        disk.move_to_end(digest)
+        self._disk_size += size
+
+        victims = []
+        while self._disk_size > self.disk_bytes and len(disk) > 1:
+            victim, victim_size = disk.popitem(last=False)
+            self._disk_size -= victim_size
+            victims.append(self._path(victim))
+        if victims:
+            await asyncio.to_thread(_unlink_all, victims)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_size,
+            "disk_entries": len(self._disk or ()),
+            "disk_bytes": self._disk_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _remember(self, digest: str, pages: List[str]):
+        size = _pages_size(pages)
+        if size > self.memory_bytes:
+            return
+        if digest in self._memory:
+            self._memory_size -= _pages_size(self._memory.pop(digest))
+        self._memory[digest] = pages
+        self._memory_size += size
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= _pages_size(evicted)
+
+    def _forget_file(self, digest: str):
+        size = self._disk.pop(digest, 0) if self._disk is not None else 0
+        self._disk_size -= size
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{self.prefix}{digest}.json")
+
+    def _read_file(self, digest: str) -> List[str]:
+        path = self._path(digest)
+        with open(path, "r", encoding="utf-8") as f:
+            pages = json.load(f)
+        # Refresh mtime so LRU order survives a restart
+        os.utime(path)
+        return pages
+
+    def _write_file(self, digest: str, pages: List[str]) -> int:
+        path = self._path(digest)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(pages, f)
+        os.replace(tmp_path, path)
+        return os.path.getsize(path)
+
+    async def _disk_index(self) -> "OrderedDict[str, int]":
+        if self._disk is None:
+            async with self._index_lock:
+                if self._disk is None:
+                    try:
+                        entries = await asyncio.to_thread(self._scan)
+                    except OSError:
+                        entries = []
+                    self._disk_size = sum(size for _, size in entries)
+                    self._disk = OrderedDict(entries)
+        return self._disk
+
+    def _scan(self) -> List[Tuple[str, int]]:
+        """List current-version entries oldest first, deleting stale-version files."""
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or entry.name.endswith(".tmp"):
+                continue
+            if not (entry.name.startswith(self.prefix) and entry.name.endswith(".json")):
+                _unlink_all([entry.path])
+                continue
+            stat = entry.stat()
+            digest = entry.name[len(self.prefix):-len(".json")]
+            entries.append((stat.st_mtime, digest, stat.st_size))
+        entries.sort()
+        return [(digest, size) for _, digest, size in entries]
+
+
+def _unlink_all(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+pdf_text_store = PdfTextStore(
+    PDF_CACHE_DIR,
+    memory_bytes=PDF_CACHE_MEMORY_BYTES,
+    disk_bytes=PDF_CACHE_DISK_BYTES,
+    version=pdftext.NORMALIZE_VERSION,
+)
+metrics.register_cache("pdf_text", pdf_text_store.stats)
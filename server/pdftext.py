@@ -0,0 +1,117 @@
+import asyncio
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import List, Optional
+
+import features
+import metrics
+
+# Process pool sizing and admission control for PDF text extraction
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_MAX_PENDING = int(os.getenv("PDF_MAX_PENDING", "16"))
+PDF_STREAM_CHUNK_PAGES = int(os.getenv("PDF_STREAM_CHUNK_PAGES", "4"))
+# Chunk jobs one streamed extraction keeps queued in the pool at a time
+PDF_STREAM_INFLIGHT_CHUNKS = int(os.getenv("PDF_STREAM_INFLIGHT_CHUNKS", "2"))
+
+# Bump whenever normalize_text/extract_pages output changes so cached text is invalidated
+NORMALIZE_VERSION = 1
+
+# pdfplumber is only imported inside the pool workers, never by the server process
+pdf = features.module_feature("pdf", "pdfplumber")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pending = 0
+
+
+class PdfPoolSaturated(Exception):
+    """Raised when too many extractions are already queued or running."""
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def join_pages(pages: List[str]) -> str:
+    return " ".join(page for page in pages if page)
+
+
+def count_pages(data: bytes) -> int:
+    import pdfplumber
+
+    try:
+        with pdfplumber.open(io.BytesIO(data)) as pdf:
+            return len(pdf.pages)
+    except Exception as e:
+        raise ValueError(f"Error reading PDF: {e}")
+
+
+def extract_pages(data: bytes, start: int = 0, stop: Optional[int] = None) -> List[str]:
+    """Return the normalized text of pages[start:stop]. Runs inside a pool worker."""
+    import pdfplumber
+
+    pages = []
+    try:
+        with pdfplumber.open(io.BytesIO(data)) as pdf:
+            for page in pdf.pages[start:stop]:
+                pages.append(normalize_text(page.extract_text() or ""))
+                # Drop the parsed layout objects so memory stays flat on long documents
+                page.close()
+    except Exception as e:
+        raise ValueError(f"Error reading PDF: {e}")
+    return pages
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn, not fork: the parent is running an event loop and client threads
+        _pool = ProcessPoolExecutor(
+            max_workers=PDF_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def acquire():
+    """Reserve one extraction slot or raise PdfPoolSaturated."""
+    global _pending
+    if _pending >= PDF_MAX_PENDING:
+        raise PdfPoolSaturated(f"{_pending} PDF extractions already pending")
+    _pending += 1
+
+
+def release():
+    global _pending
+    _pending -= 1
+
+
+@contextmanager
+def admit():
+    acquire()
+    try:
+        yield
+    finally:
+        release()
+
+
+def pending() -> int:
+    return _pending
+
+
+metrics.register_gauge("pdf_pool_pending", "PDF extraction jobs admitted and not yet finished.", pending)
+
+
+async def run_in_pool(fn, *args):
+    loop = asyncio.get_running_loop()
+    with metrics.track("pdf", fn.__name__):
+        return await loop.run_in_executor(_get_pool(), fn, *args)
@@ -0,0 +1,61 @@
+import base64
+import hashlib
+import json
+import zlib
+from typing import List, Optional, Tuple
+
+QUIZ_FORMAT = "zlib-json-v1"
+
+# Question fields students must not see before answering, including the keys of
+# older quiz shapes (the quiz player and its dummy data use "answers")
+_ANSWER_FIELDS = frozenset((
+    "answer", "answers", "correctAnswer", "correctAnswers", "correct_answer", "correct_answers",
+    "correct", "solution", "solutions", "explanation", "explanations",
+))
+
+
+def _canonical(value) -> bytes:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def content_hash(quiz: dict) -> str:
+    """SHA-256 of the quiz's canonical JSON; stable across key order and whitespace."""
+    return hashlib.sha256(_canonical(quiz)).hexdigest()
+
+
+def pack_quiz(quiz: dict) -> dict:
+    """Split a validated quiz into the columns stored in the ``quiz`` table.
+
+    ``quiz_data`` keeps a small uncompressed header (title, limits, question
+    count); the questions themselves go into ``quiz_blob`` as compressed JSON.
+    """
+    questions = quiz.get("questions", [])
+    header = {k: v for k, v in quiz.items() if k != "questions"}
+    header["questionCount"] = len(questions)
+    header["format"] = QUIZ_FORMAT
+    blob = base64.b64encode(zlib.compress(_canonical(questions), 9)).decode("ascii")
+    return {"quiz_data": header, "quiz_blob": blob, "content_hash": content_hash(quiz)}
+
+
+def unpack_quiz(row: dict) -> Tuple[dict, List[dict], str]:
+    """Return (header, questions, content hash) for a stored row, old blob-only rows included."""
+    data = row.get("quiz_data") or {}
+    blob = row.get("quiz_blob")
+    if not blob:
+        # Stored before compact storage: the whole quiz lives in quiz_data
+        questions = data.get("questions", []) if isinstance(data.get("questions"), list) else []
+        header = {k: v for k, v in data.items() if k != "questions"}
+        header["questionCount"] = len(questions)
+        return header, questions, row.get("content_hash") or content_hash(data)
+    header = {k: v for k, v in data.items() if k != "format"}
+    questions = json.loads(zlib.decompress(base64.b64decode(blob)))
+    return header, questions, row["content_hash"]
+
+
+def select_questions(questions: List[dict], start: int = 0, end: Optional[int] = None,
+                     stems_only: bool = False) -> List[dict]:
+    """Slice ``questions[start:end]``, dropping answers and explanations if ``stems_only``."""
+    picked = questions[start:end]
+    if stems_only:
+        picked = [{k: v for k, v in q.items() if k not in _ANSWER_FIELDS} for q in picked]
+    return picked
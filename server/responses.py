@@ -0,0 +1,83 @@
+import functools
+import inspect
+import json
+from typing import Any, Callable, List, Optional, Tuple, Type
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional speed-up; falls back to the stdlib encoder
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed, compact stdlib JSON otherwise."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            # Non-str keys show up in stats payloads (e.g. queue depth by priority)
+            return orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=jsonable_encoder).encode("utf-8")
+
+
+def _envelope_fields(model: Type[BaseModel]) -> List[Tuple[str, bool, Any]]:
+    return [
+        (name, field.is_required(), None if field.is_required() else field.get_default(call_default_factory=True))
+        for name, field in model.model_fields.items()
+    ]
+
+
+def _envelope(result: Any, model: Type[BaseModel], fields: List[Tuple[str, bool, Any]]) -> Optional[dict]:
+    """Shape a handler result like ``model`` without re-validating it, or None if it can't be trusted."""
+    if isinstance(result, model):
+        return result.model_dump(mode="json")
+    if not isinstance(result, dict):
+        return None
+    content = {}
+    for name, required, default in fields:
+        if name in result:
+            content[name] = result[name]
+        elif required:
+            return None
+        else:
+            content[name] = default
+    return content
+
+
+def _trusted(endpoint: Callable, model: Type[BaseModel]) -> Callable:
+    fields = _envelope_fields(model)
+
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        result = await endpoint(*args, **kwargs)
+        content = _envelope(result, model, fields)
+        if content is None:
+            # Unexpected shape: let FastAPI validate it as usual
+            return result
+        return FastJSONResponse(content)
+
+    wrapper.fast_envelope = True
+    return wrapper
+
+
+class FastRoute(APIRoute):
+    """APIRoute that trusts handlers to build their own ``response_model`` envelope.
+
+    The model still documents the endpoint in OpenAPI, but a handler result is
+    only reshaped to the model's fields (filling defaults) and rendered with
+    FastJSONResponse, skipping pydantic's validate-then-serialize pass and
+    ``jsonable_encoder``. Results missing a required field fall back to the
+    normal validated path.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        model = kwargs.get("response_model")
+        # include_router() rebuilds routes from already wrapped endpoints
+        if (inspect.isclass(model) and issubclass(model, BaseModel) and inspect.iscoroutinefunction(endpoint)
+                and not getattr(endpoint, "fast_envelope", False)):
+            endpoint = _trusted(endpoint, model)
+        super().__init__(path, endpoint, **kwargs)
@@ -1 +0,0 @@
-from routes.authRoute import router as auth_router
\ No newline at end of file
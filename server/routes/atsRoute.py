@@ -1,37 +1,106 @@
-from fastapi import APIRouter, UploadFile, HTTPException
-import pdfplumber
+from fastapi import APIRouter, Depends, UploadFile, HTTPException
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
+from collections import deque
+from responses import FastRoute
+import pdftext
+from pdfcache import pdf_text_store, read_and_hash
 
-router = APIRouter()
+router = APIRouter(route_class=FastRoute)
 
-def extract_text_from_pdf(file: UploadFile) -> str:
-    text = ""
+async def extract_text_from_pdf(file: UploadFile) -> str:
+    """Extract normalized text from an uploaded PDF, reusing cached text for repeat uploads."""
+    data, digest = await read_and_hash(file)
+    pages = await pdf_text_store.get(digest)
+    if pages is None:
+        with pdftext.admit():
+            pages = await pdftext.run_in_pool(pdftext.extract_pages, data)
+        await pdf_text_store.put(digest, pages)
+    return pdftext.join_pages(pages)
+
+class _PdfSlotResponse(StreamingResponse):
+    """Streaming response that gives back its extraction slot once sent, even if the client left before the first byte."""
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            pdftext.release()
+
+def _ndjson_pages(pages, filename: str):
+    for page_no, text in enumerate(pages, start=1):
+        yield json.dumps({"page": page_no, "text": text}) + "\n"
+    yield json.dumps({"done": True, "pages": len(pages), "filename": filename}) + "\n"
+
+async def _stream_pdf_pages(data: bytes, digest: str, filename: str):
+    """Yield NDJSON lines of normalized page text, in page order, as chunks finish.
+
+    Only PDF_STREAM_INFLIGHT_CHUNKS chunk jobs are in the pool at once; the
+    next chunk is submitted as the oldest one is read out.
+    """
+    jobs = deque()
     try:
-        with pdfplumber.open(file.file) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + " "
+        page_count = await pdftext.run_in_pool(pdftext.count_pages, data)
+        chunk = max(1, pdftext.PDF_STREAM_CHUNK_PAGES)
+        starts = iter(range(0, page_count, chunk))
+
+        def submit_next():
+            start = next(starts, None)
+            if start is not None:
+                jobs.append(asyncio.ensure_future(pdftext.run_in_pool(pdftext.extract_pages, data, start, start + chunk)))
+
+        for _ in range(max(1, pdftext.PDF_STREAM_INFLIGHT_CHUNKS)):
+            submit_next()
+        pages = []
+        while jobs:
+            texts = await jobs[0]
+            jobs.popleft()
+            submit_next()
+            for text in texts:
+                pages.append(text)
+                yield json.dumps({"page": len(pages), "text": text}) + "\n"
+        await pdf_text_store.put(digest, pages)
+        yield json.dumps({"done": True, "pages": page_count, "filename": filename}) + "\n"
     except Exception as e:
-        raise ValueError(f"Error reading PDF: {e}")
-    
-    return " ".join(text.split()).lower() 
+        yield json.dumps({"error": str(e)}) + "\n"
+    finally:
+        for job in jobs:
+            job.cancel()
 
-@router.post("/extract-pdf")
-async def extract_pdf_text(pdf_file: UploadFile):
+@router.post("/extract-pdf", dependencies=[Depends(pdftext.pdf.require)])
+async def extract_pdf_text(pdf_file: UploadFile, stream: bool = False):
     try:
         # Validate file type
         if not pdf_file.filename.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="File must be a PDF")
-        
-        extracted_text = extract_text_from_pdf(pdf_file)
-        
+
+        if stream:
+            data, digest = await read_and_hash(pdf_file)
+            pages = await pdf_text_store.get(digest)
+            if pages is not None:
+                return StreamingResponse(_ndjson_pages(pages, pdf_file.filename), media_type="application/x-ndjson")
+
+            pdftext.acquire()
+            return _PdfSlotResponse(_stream_pdf_pages(data, digest, pdf_file.filename), media_type="application/x-ndjson")
+
+        extracted_text = await extract_text_from_pdf(pdf_file)
+
         if not extracted_text:
             raise ValueError("No text found in the PDF file.")
-        
+
         return {
             "extracted_text": extracted_text,
             "filename": pdf_file.filename,
             "message": "PDF text extracted successfully"
         }
+    except HTTPException:
+        raise
+    except pdftext.PdfPoolSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "2"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/cache-stats")
+async def get_pdf_cache_stats():
+    return pdf_text_store.stats()
@@ -0,0 +1,154 @@
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from typing import List, Optional
+import asyncio
+import os
+import time
+from responses import FastRoute
+from cache import SharedTTLCache, TTLCache
+import atsscore
+import metrics
+import pdftext
+from routes.atsRoute import extract_text_from_pdf
+from models.atsModel import atsJobReqMod, atsJobResMod, atsScoreResMod
+
+router = APIRouter(route_class=FastRoute)
+
+# Upper bound on resumes scored in one call
+ATS_MAX_RESUMES = int(os.getenv("ATS_MAX_RESUMES", "500"))
+# PDFs extracted at once by all batches in this worker; leaves room in the pool for other requests
+ATS_EXTRACT_CONCURRENCY = int(os.getenv("ATS_EXTRACT_CONCURRENCY", str(max(1, pdftext.PDF_MAX_PENDING // 2))))
+# How long a resume waits for a free extraction slot before it is reported as failed
+ATS_EXTRACT_WAIT_S = float(os.getenv("ATS_EXTRACT_WAIT_S", "120"))
+ATS_JOB_CACHE_SIZE = int(os.getenv("ATS_JOB_CACHE_SIZE", "256"))
+ATS_JOB_TTL_S = float(os.getenv("ATS_JOB_TTL_S", "86400"))
+
+# jd_id -> source text and keywords, shared so any worker can rebuild a profile
+_job_sources = SharedTTLCache("ats_jd", ATS_JOB_CACHE_SIZE, ATS_JOB_TTL_S)
+# jd_id -> JobProfile built in this worker
+_job_profiles = TTLCache(ATS_JOB_CACHE_SIZE, ATS_JOB_TTL_S)
+
+metrics.register_cache("ats_jobs", _job_profiles.stats)
+
+# Shared by every batch, so concurrent batches queue here instead of filling the pool
+_extract_slots = asyncio.Semaphore(ATS_EXTRACT_CONCURRENCY)
+
+def _remember_job(text: str, keywords: Optional[List[str]]) -> atsscore.JobProfile:
+    job_id = atsscore.job_id(text, keywords)
+    profile = _job_profiles.get(job_id)
+    if profile is None:
+        profile = atsscore.JobProfile(text, keywords)
+        _job_profiles.set(job_id, profile)
+        _job_sources.store(job_id, {"text": text, "keywords": keywords})
+    return profile
+
+async def _lookup_job(job_id: str) -> Optional[atsscore.JobProfile]:
+    profile = _job_profiles.get(job_id)
+    if profile is not None:
+        return profile
+    source = await _job_sources.fetch(job_id)
+    if source is None:
+        return None
+    profile = atsscore.JobProfile(source["text"], source["keywords"])
+    _job_profiles.set(job_id, profile)
+    return profile
+
+def _split_keywords(keywords: Optional[str]) -> Optional[List[str]]:
+    if not keywords:
+        return None
+    return [k.strip() for k in keywords.split(",") if k.strip()] or None
+
+async def _extract_queued(file: UploadFile) -> str:
+    """Extract one resume, waiting with backoff while interactive requests hold the pool."""
+    deadline = time.monotonic() + ATS_EXTRACT_WAIT_S
+    delay = 0.05
+    while True:
+        try:
+            return await extract_text_from_pdf(file)
+        except pdftext.PdfPoolSaturated:
+            if time.monotonic() + delay > deadline:
+                raise
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 1.0)
+        await file.seek(0)
+
+async def _extract_all(files: List[UploadFile]) -> List[dict]:
+    """Extract every resume's text, queueing for pool capacity; failures are kept per file."""
+    async def extract(file: UploadFile) -> dict:
+        if not (file.filename or "").lower().endswith(".pdf"):
+            return {"filename": file.filename, "error": "File must be a PDF"}
+        async with _extract_slots:
+            try:
+                text = await _extract_queued(file)
+            except pdftext.PdfPoolSaturated:
+                return {"filename": file.filename, "error": "PDF extraction is busy; try this resume again later"}
+            except Exception as e:
+                return {"filename": file.filename, "error": f"Could not read PDF: {e}"}
+        if not text:
+            return {"filename": file.filename, "error": "No text found in the PDF file."}
+        return {"filename": file.filename, "text": text}
+
+    return await asyncio.gather(*(extract(file) for file in files))
+
+@router.post("/job", response_model=atsJobResMod, dependencies=[Depends(atsscore.ats.require)])
+async def create_job(job: atsJobReqMod):
+    """Prepare a job description once; pass the returned jd_id to /score for each batch."""
+    profile = _remember_job(job.job_description, job.keywords)
+    return {"error": False, "message": "Job description saved", "jd_id": profile.id, "keywords": profile.keywords}
+
+@router.post(
+    "/score",
+    response_model=atsScoreResMod,
+    dependencies=[Depends(pdftext.pdf.require), Depends(atsscore.ats.require)],
+)
+async def score_resumes(
+    resumes: List[UploadFile] = File(...),
+    job_description: Optional[str] = Form(None),
+    jd_id: Optional[str] = Form(None),
+    keywords: Optional[str] = Form(None),
+    top: Optional[int] = Form(None, ge=1),
+):
+    """Rank uploaded resumes against a job description.
+
+    Send the description itself (with optional comma-separated ``keywords``)
+    or the ``jd_id`` from /job. Resumes that can't be read are listed after
+    the ranked ones with an ``error`` and no score.
+    """
+    if len(resumes) > ATS_MAX_RESUMES:
+        raise HTTPException(status_code=400, detail=f"At most {ATS_MAX_RESUMES} resumes per request")
+    if job_description:
+        profile = _remember_job(job_description, _split_keywords(keywords))
+    elif jd_id:
+        profile = await _lookup_job(jd_id)
+        if profile is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired jd_id; send the job description again")
+    else:
+        raise HTTPException(status_code=400, detail="Provide job_description or jd_id")
+
+    extracted = await _extract_all(resumes)
+    readable = [item for item in extracted if "text" in item]
+    scores = await asyncio.to_thread(atsscore.score_batch, profile, [item["text"] for item in readable])
+
+    ranked = sorted(
+        ({"filename": item["filename"], **score, "error": None} for item, score in zip(readable, scores)),
+        key=lambda result: -result["score"],
+    )
+    if top is not None:
+        ranked = ranked[:top]
+    for rank, result in enumerate(ranked, start=1):
+        result["rank"] = rank
+    failed = [
+        {"rank": None, "filename": item["filename"], "score": None, "similarity": None, "keyword_coverage": None,
+         "matched_keywords": [], "missing_keywords": [], "error": item["error"]}
+        for item in extracted if "error" in item
+    ]
+    return {
+        "error": False,
+        "message": f"Scored {len(readable)} of {len(resumes)} resumes",
+        "jd_id": profile.id,
+        "keywords": profile.keywords,
+        "results": ranked + failed,
+    }
+
+@router.get("/cache-stats")
+async def get_ats_cache_stats():
+    return {"jobs": _job_profiles.stats(), "job_sources": _job_sources.stats()}
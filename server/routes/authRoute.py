@@ -1,41 +1,78 @@
-from fastapi import APIRouter, HTTPException
-from supabase import create_client, Client
-import os
-from auth import hashed_pass, verify_hash_pass, jwt_encode
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from postgrest import AsyncPostgrestClient
+from responses import FastRoute
+from db import get_db, insert_unique, AlreadyExists
+from auth import (
+    hash_password, verify_password, needs_rehash, hash_pool_stats, HashPoolSaturated,
+    create_session_tokens, jwt_decode, get_current_user, sessions,
+)
+import logging
 import uuid
-from models import userReqMod,userResMod,loginReqMod
+from models import userReqMod,userResMod,loginReqMod,refreshReqMod
 
-router = APIRouter()
+router = APIRouter(route_class=FastRoute)
+logger = logging.getLogger(__name__)
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+def _hashing_busy() -> HTTPException:
+    return HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
 
-@router.post("/login", response_model=userResMod)
-async def login(req: loginReqMod):
-    response = supabase.table("login").select("uid, password, username").eq("email", req.email).single().execute()
+async def _upgrade_password_hash(supabase: AsyncPostgrestClient, uid: str, password: str):
+    """Re-hash a password stored in an older format. Best effort; runs after the response."""
+    try:
+        new_hash = await hash_password(password)
+        await supabase.table("login").update({"password": new_hash}).eq("uid", uid).execute()
+    except Exception as e:
+        logger.warning("Failed to upgrade password hash", extra={"uid": uid, "error": repr(e)})
+
+@router.post("/login", response_model=userResMod, dependencies=[Depends(sessions.require)])
+async def login(req: loginReqMod, background_tasks: BackgroundTasks, supabase: AsyncPostgrestClient = Depends(get_db)):
+    response = await supabase.table("login").select("uid, password, username").eq("email", req.email).single().execute()
     if not response.data:
         return {"error": True, "token": "", "username": ""}
     user = response.data
-    if not verify_hash_pass(req.password, user["password"]):
+    try:
+        valid = await verify_password(req.password, user["password"])
+    except HashPoolSaturated:
+        raise _hashing_busy()
+    if not valid:
         return {"error": True, "token": "", "username": ""}
-    return {"error": False, "token": user["uid"], "username": user["username"]}
+    if needs_rehash(user["password"]):
+        background_tasks.add_task(_upgrade_password_hash, supabase, user["uid"], req.password)
+    return {"error": False, "username": user["username"], **create_session_tokens(user["uid"], user["username"])}
 
-@router.post("/register", response_model=userResMod)
-async def register(req: userReqMod):
-    response = supabase.table("login").select("uid").eq("email", req.email).execute()
-    if response.data:
-        return {"error": True, "token": "", "username": ""}
-    hash_pass = hashed_pass(req.password)
+@router.post("/register", response_model=userResMod, dependencies=[Depends(sessions.require)])
+async def register(req: userReqMod, supabase: AsyncPostgrestClient = Depends(get_db)):
+    try:
+        hash_pass = await hash_password(req.password)
+    except HashPoolSaturated:
+        raise _hashing_busy()
     user_id = str(uuid.uuid4())
-    response = supabase.table("login").insert({
-        "uid": user_id,
-        "email": req.email,
-        "password": hash_pass,
-        "username": req.username,
-        "name": req.name,
-        "college": req.college,
-        "branch": req.branch,
-        "year": req.year
-    }).execute()
-    return {"error": False, "token": user_id, "username": req.username}
\ No newline at end of file
+    try:
+        await insert_unique(supabase, "login", {
+            "uid": user_id,
+            "email": req.email,
+            "password": hash_pass,
+            "username": req.username,
+            "name": req.name,
+            "college": req.college,
+            "branch": req.branch,
+            "year": req.year
+        }, on_conflict="email")
+    except AlreadyExists:
+        return {"error": True, "token": "", "username": ""}
+    return {"error": False, "username": req.username, **create_session_tokens(user_id, req.username)}
+
+@router.post("/refresh", response_model=userResMod, dependencies=[Depends(sessions.require)])
+async def refresh(req: refreshReqMod):
+    claims = jwt_decode(req.refresh_token)
+    if claims.get("type") != "refresh" or not claims.get("sub"):
+        return {"error": True, "token": "", "username": ""}
+    return {"error": False, "username": claims.get("username", ""), **create_session_tokens(claims["sub"], claims.get("username", ""))}
+
+@router.get("/me")
+async def me(user: dict = Depends(get_current_user)):
+    return {"error": False, "uid": user["sub"], "username": user.get("username", "")}
+
+@router.get("/hash-stats")
+async def get_hash_stats():
+    return hash_pool_stats()
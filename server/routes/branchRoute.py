@@ -1,48 +1,68 @@
-from fastapi import APIRouter
-from supabase import create_client, Client
-import os
+from fastapi import APIRouter, Depends, HTTPException, UploadFile
+from postgrest import AsyncPostgrestClient
+from responses import FastRoute
+from db import get_db, insert_unique, AlreadyExists
+from catalog import branch_cache
+from bulkimport import detect_format, import_rows
+from listing import KeysetListing, ListParams
+from models.importModel import importResMod
 from models.branchModel import branchReqMod, branchGetReqMod, branchResMod
 
-router = APIRouter()
+router = APIRouter(route_class=FastRoute)
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+branch_listing = KeysetListing("branch", "branch_id", ("branch_id", "branch_name"))
 
 @router.post("/add", response_model=branchResMod)
-async def add_branch(req: branchReqMod):
+async def add_branch(req: branchReqMod, supabase: AsyncPostgrestClient = Depends(get_db)):
     try:
-        # Check if branch_id already exists
-        response = supabase.table("branch").select("branch_id").eq("branch_id", req.branch_id).execute()
-        if response.data:
-            return {"error": True, "message": "Branch ID already exists", "data": []}
-        
-        # Insert new branch
-        response = supabase.table("branch").insert({
+        await insert_unique(supabase, "branch", {
             "branch_id": req.branch_id,
             "branch_name": req.branch_name
-        }).execute()
+        }, on_conflict="branch_id")
+        branch_cache.invalidate()
         
         return {"error": False, "message": "Branch added successfully", "data": []}
+    except AlreadyExists:
+        return {"error": True, "message": "Branch ID already exists", "data": []}
     except Exception as e:
         return {"error": True, "message": f"Failed to add branch: {str(e)}", "data": []}
 
 @router.post("/get", response_model=branchResMod)
-async def get_branch(req: branchGetReqMod):
+async def get_branch(req: branchGetReqMod, supabase: AsyncPostgrestClient = Depends(get_db)):
     try:
-        response = supabase.table("branch").select("*").eq("branch_id", req.branch_id).execute()
-        if not response.data:
+        data = await branch_cache.lookup(supabase, "branch_id", req.branch_id)
+        if not data:
             return {"error": True, "message": "Branch not found", "data": []}
         
-        return {"error": False, "message": "Branch retrieved successfully", "data": response.data}
+        return {"error": False, "message": "Branch retrieved successfully", "data": data}
     except Exception as e:
         return {"error": True, "message": f"Failed to retrieve branch: {str(e)}", "data": []}
 
 @router.get("/all", response_model=branchResMod)
-async def get_all_branches():
+async def get_all_branches(page: ListParams = Depends(), supabase: AsyncPostgrestClient = Depends(get_db)):
     try:
-        response = supabase.table("branch").select("*").execute()
+        if page.requested:
+            return await branch_listing.respond(supabase, page, {}, "All branches retrieved successfully")
+        data = await branch_cache.all(supabase)
         
-        return {"error": False, "message": "All branches retrieved successfully", "data": response.data}
+        return {"error": False, "message": "All branches retrieved successfully", "data": data}
     except Exception as e:
-        return {"error": True, "message": f"Failed to retrieve branches: {str(e)}", "data": []}
\ No newline at end of file
+        return {"error": True, "message": f"Failed to retrieve branches: {str(e)}", "data": []}
+
+@router.post("/import", response_model=importResMod)
+async def import_branches(file: UploadFile, supabase: AsyncPostgrestClient = Depends(get_db)):
+    fmt = detect_format(file)
+    if fmt is None:
+        raise HTTPException(status_code=400, detail="File must be CSV or NDJSON")
+    try:
+        result = await import_rows(supabase, file, fmt, "branch", branchReqMod, key="branch_id")
+    except Exception as e:
+        return {"error": True, "message": f"Failed to import branches: {str(e)}"}
+    finally:
+        # Rows from earlier chunks may have landed even if a later one failed
+        branch_cache.invalidate()
+    return result
+
+@router.get("/cache-stats")
+async def get_branch_cache_stats():
+    return branch_cache.stats()
\ No newline at end of file
@@ -1,11 +1,42 @@
 from fastapi import APIRouter, HTTPException, Header
 from typing import Optional, List
+import asyncio
+import hashlib
 import httpx
+import logging
 import os
+import time
+from responses import FastRoute
+from cache import TTLCache, SingleFlight
+import metrics
 from pydantic import BaseModel
 from datetime import datetime
 
-router = APIRouter()
+router = APIRouter(route_class=FastRoute)
+logger = logging.getLogger(__name__)
+
+# Overridable so load tests can point at a local stand-in
+CLASSROOM_API = os.getenv("CLASSROOM_API_URL", "https://classroom.googleapis.com/v1").rstrip("/")
+# Max concurrent courseWork fetches per request
+CLASSROOM_CONCURRENCY = int(os.getenv("CLASSROOM_CONCURRENCY", "6"))
+CLASSROOM_PAGE_SIZE = 100
+TOKENINFO_URL = os.getenv("GOOGLE_TOKENINFO_URL", "https://oauth2.googleapis.com/tokeninfo")
+
+# Per-user assignments cache: served as-is for TTL, then served stale while a
+# background refresh runs, until MAX_STALE when a refresh is awaited instead
+CLASSROOM_CACHE_TTL_S = float(os.getenv("CLASSROOM_CACHE_TTL_S", "60"))
+CLASSROOM_CACHE_MAX_STALE_S = float(os.getenv("CLASSROOM_CACHE_MAX_STALE_S", "900"))
+CLASSROOM_CACHE_MAXSIZE = int(os.getenv("CLASSROOM_CACHE_MAXSIZE", "1024"))
+# Upper bound on how long a token -> user mapping is trusted
+TOKEN_SUBJECT_TTL_S = 600
+
+_http_client: Optional[httpx.AsyncClient] = None
+_token_subjects = TTLCache(CLASSROOM_CACHE_MAXSIZE, TOKEN_SUBJECT_TTL_S)
+_assignments_cache = TTLCache(CLASSROOM_CACHE_MAXSIZE, CLASSROOM_CACHE_MAX_STALE_S)
+_refreshes = SingleFlight()
+_background_refreshes = set()
+
+metrics.register_cache("classroom_assignments", _assignments_cache.stats)
 
 class Assignment(BaseModel):
     course: str
@@ -17,6 +48,197 @@ class AssignmentsResponse(BaseModel):
     assignments: List[Assignment]
     error: Optional[str] = None
 
+def _classroom_operation(request: httpx.Request) -> str:
+    # ".../courses/123/courseWork" -> "courseWork"
+    return request.url.path.rstrip("/").rsplit("/", 1)[-1]
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=15.0,
+            transport=metrics.instrumented_transport(
+                "classroom",
+                _classroom_operation,
+                http2=True,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            ),
+        )
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+def _due_datetime(work: dict) -> Optional[datetime]:
+    due_date_data = work.get("dueDate")
+    if not due_date_data:
+        return None
+    due_time_data = work.get("dueTime", {})
+    return datetime(
+        year=due_date_data["year"],
+        month=due_date_data["month"],
+        day=due_date_data["day"],
+        hour=due_time_data.get("hours", 23),
+        minute=due_time_data.get("minutes", 59)
+    )
+
+async def _get_all_pages(url: str, headers: dict, params: dict, items_key: str, stop=None) -> List[dict]:
+    """Follow nextPageToken until the listing is exhausted or ``stop(page_items)`` is true."""
+    client = _get_http_client()
+    items = []
+    page_token = None
+    while True:
+        page_params = {**params, "pageSize": CLASSROOM_PAGE_SIZE}
+        if page_token:
+            page_params["pageToken"] = page_token
+        response = await client.get(url, headers=headers, params=page_params)
+        response.raise_for_status()
+        data = response.json()
+        page_items = data.get(items_key, [])
+        items.extend(page_items)
+        page_token = data.get("nextPageToken")
+        if not page_token or (stop is not None and stop(page_items)):
+            return items
+
+async def _list_coursework(course: dict, headers: dict, semaphore: asyncio.Semaphore, params: dict,
+                          stop=None) -> Optional[List[dict]]:
+    """A course's published coursework, or None if the course could not be fetched."""
+    try:
+        async with semaphore:
+            return await _get_all_pages(
+                f"{CLASSROOM_API}/courses/{course['id']}/courseWork",
+                headers,
+                {"courseWorkStates": "PUBLISHED", **params},
+                "courseWork",
+                stop=stop,
+            )
+    except Exception as course_error:
+        logger.warning("Failed to fetch course coursework", extra={"course": course.get("name"), "error": repr(course_error)})
+        return None
+
+def _upcoming_assignments(course: dict, coursework: List[dict], now: datetime) -> List[Assignment]:
+    assignments = []
+    for work in coursework:
+        due_datetime = _due_datetime(work)
+        # Only include future assignments
+        if due_datetime is not None and due_datetime >= now:
+            assignments.append(Assignment(
+                course=course.get("name", "Unknown Course"),
+                title=work.get("title", "Untitled Assignment"),
+                due=due_datetime,
+                description=work.get("description", "")
+            ))
+    return assignments
+
+def _coursework_fingerprint(coursework: List[dict]) -> str:
+    """Digest of the ids and updateTimes of a course's published coursework.
+
+    Edits change an updateTime and deletions or unpublishing change the id
+    set, so an unchanged digest means the cached assignments are still right.
+    An empty course still gets a digest so it is not re-fetched every time.
+    """
+    marks = sorted(f"{work.get('id')}@{work.get('updateTime')}" for work in coursework)
+    return hashlib.sha256("\n".join(marks).encode("utf-8")).hexdigest()
+
+async def _get_course_assignments(course: dict, headers: dict, semaphore: asyncio.Semaphore, now: datetime) -> Optional[List[Assignment]]:
+    """Upcoming assignments for one course, or None if the course could not be fetched."""
+    def reached_past_due(page_items: List[dict]) -> bool:
+        # Pages come newest due date first, so once one ends in the past the rest are too
+        last_due = _due_datetime(page_items[-1]) if page_items else None
+        return last_due is not None and last_due < now
+
+    coursework = await _list_coursework(course, headers, semaphore, {
+        "orderBy": "dueDate desc",
+        "fields": "courseWork(title,description,dueDate,dueTime),nextPageToken",
+    }, stop=reached_past_due)
+    return None if coursework is None else _upcoming_assignments(course, coursework, now)
+
+async def _get_course_fingerprint(course: dict, headers: dict, semaphore: asyncio.Semaphore) -> Optional[str]:
+    """Fingerprint of a cached course's coursework, from a listing of ids and updateTimes only."""
+    coursework = await _list_coursework(course, headers, semaphore, {"fields": "courseWork(id,updateTime),nextPageToken"})
+    return None if coursework is None else _coursework_fingerprint(coursework)
+
+async def _load_course(course: dict, headers: dict, semaphore: asyncio.Semaphore, now: datetime) -> Optional[dict]:
+    """Fingerprint and upcoming assignments of a course not cached yet, from one full listing."""
+    coursework = await _list_coursework(course, headers, semaphore, {
+        "fields": "courseWork(id,title,description,dueDate,dueTime,updateTime),nextPageToken",
+    })
+    if coursework is None:
+        return None
+    return {"fingerprint": _coursework_fingerprint(coursework), "assignments": _upcoming_assignments(course, coursework, now)}
+
+async def _get_user_key(access_token: str) -> str:
+    """Hash of the Google account behind a token, so tokens are never used as cache keys."""
+    token_key = hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+    subject = _token_subjects.get(token_key)
+    if subject is None:
+        response = await _get_http_client().get(TOKENINFO_URL, params={"access_token": access_token})
+        if response.status_code != 200:
+            raise HTTPException(status_code=401, detail="Invalid or expired Google access token")
+        info = response.json()
+        # Tokens without an openid scope carry no subject; fall back to a per-token key
+        subject = info.get("sub") or f"token:{token_key}"
+        try:
+            ttl = min(TOKEN_SUBJECT_TTL_S, float(info.get("expires_in", TOKEN_SUBJECT_TTL_S)))
+        except ValueError:
+            ttl = TOKEN_SUBJECT_TTL_S
+        _token_subjects.set(token_key, subject, ttl=ttl)
+    return hashlib.sha256(subject.encode("utf-8")).hexdigest()
+
+async def _refresh_user_assignments(user_key: str, headers: dict, previous: Optional[dict]) -> dict:
+    """Re-fetch only the courses whose coursework fingerprint changed since ``previous``."""
+    previous_courses = previous["courses"] if previous else {}
+
+    try:
+        courses = await _get_all_pages(
+            f"{CLASSROOM_API}/courses",
+            headers,
+            {"courseStates": "ACTIVE", "fields": "courses(id,name),nextPageToken"},
+            "courses",
+        )
+    except httpx.HTTPStatusError as exc:
+        raise HTTPException(status_code=exc.response.status_code, 
+                          detail="Failed to fetch courses from Google Classroom")
+
+    now = datetime.now()
+    semaphore = asyncio.Semaphore(CLASSROOM_CONCURRENCY)
+
+    async def refresh_course(course: dict):
+        cached = previous_courses.get(course["id"])
+        if cached is None:
+            loaded = await _load_course(course, headers, semaphore, now)
+            # Unreadable courses are retried on the next refresh
+            return course["id"], loaded or {"fingerprint": None, "assignments": []}
+        fingerprint = await _get_course_fingerprint(course, headers, semaphore)
+        if fingerprint is not None and cached["fingerprint"] == fingerprint:
+            return course["id"], cached
+        assignments = await _get_course_assignments(course, headers, semaphore, now)
+        if assignments is None:
+            # Keep what we had and force a re-fetch next time
+            return course["id"], {"fingerprint": None, "assignments": cached["assignments"]}
+        return course["id"], {"fingerprint": fingerprint, "assignments": assignments}
+
+    entry = {
+        "fetched_at": time.monotonic(),
+        "courses": dict(await asyncio.gather(*(refresh_course(course) for course in courses))),
+    }
+    _assignments_cache.set(user_key, entry)
+    return entry
+
+def _refresh_in_background(user_key: str, headers: dict, previous: dict):
+    async def refresh():
+        try:
+            await _refreshes.do(user_key, lambda: _refresh_user_assignments(user_key, headers, previous))
+        except Exception as e:
+            logger.warning("Background assignments refresh failed", extra={"error": repr(e)})
+
+    task = asyncio.ensure_future(refresh())
+    _background_refreshes.add(task)
+    task.add_done_callback(_background_refreshes.discard)
+
 @router.get("/assignments", response_model=AssignmentsResponse)
 async def get_assignments(authorization: str = Header(...)):
     """
@@ -35,70 +257,33 @@ async def get_assignments(authorization: str = Header(...)):
             "Content-Type": "application/json"
         }
         
-        async with httpx.AsyncClient() as client:
-            # Get courses
-            courses_response = await client.get(
-                "https://classroom.googleapis.com/v1/courses",
-                headers=headers,
-                params={"courseStates": "ACTIVE"}
-            )
-            
-            if courses_response.status_code != 200:
-                raise HTTPException(status_code=courses_response.status_code, 
-                                  detail="Failed to fetch courses from Google Classroom")
-            
-            courses_data = courses_response.json()
-            courses = courses_data.get("courses", [])
-            
-            all_assignments = []
-            
-            # Get assignments for each course
-            for course in courses:
-                try:
-                    coursework_response = await client.get(
-                        f"https://classroom.googleapis.com/v1/courses/{course['id']}/courseWork",
-                        headers=headers
-                    )
-                    
-                    if coursework_response.status_code == 200:
-                        coursework_data = coursework_response.json()
-                        coursework = coursework_data.get("courseWork", [])
-                        
-                        for work in coursework:
-                            if work.get("dueDate"):
-                                # Parse due date
-                                due_date_data = work["dueDate"]
-                                due_time_data = work.get("dueTime", {})
-                                
-                                due_datetime = datetime(
-                                    year=due_date_data["year"],
-                                    month=due_date_data["month"],
-                                    day=due_date_data["day"],
-                                    hour=due_time_data.get("hours", 23),
-                                    minute=due_time_data.get("minutes", 59)
-                                )
-                                
-                                # Only include future assignments
-                                if due_datetime >= datetime.now():
-                                    assignment = Assignment(
-                                        course=course.get("name", "Unknown Course"),
-                                        title=work.get("title", "Untitled Assignment"),
-                                        due=due_datetime,
-                                        description=work.get("description", "")
-                                    )
-                                    all_assignments.append(assignment)
-                                    
-                except Exception as course_error:
-                    print(f"Error fetching assignments for course {course.get('name')}: {course_error}")
-                    continue
-            
-            # Sort by due date (earliest first)
-            all_assignments.sort(key=lambda x: x.due)
-            
-            return AssignmentsResponse(assignments=all_assignments)
+        user_key = await _get_user_key(access_token)
+        entry = _assignments_cache.get(user_key)
+        if entry is None:
+            entry = await _refreshes.do(user_key, lambda: _refresh_user_assignments(user_key, headers, None))
+        elif time.monotonic() - entry["fetched_at"] > CLASSROOM_CACHE_TTL_S:
+            # Serve the stale copy now and refresh it for next time
+            _refresh_in_background(user_key, headers, entry)
+        
+        now = datetime.now()
+        all_assignments = [
+            assignment
+            for course in entry["courses"].values()
+            for assignment in course["assignments"]
+            if assignment.due >= now
+        ]
+        
+        # Sort by due date (earliest first)
+        all_assignments.sort(key=lambda x: x.due)
+        
+        return AssignmentsResponse(assignments=all_assignments)
             
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error fetching assignments: {e}")
-        raise HTTPException(status_code=500, detail="Failed to fetch assignments from Google Classroom")
\ No newline at end of file
+        logger.exception("Failed to fetch assignments")
+        raise HTTPException(status_code=500, detail="Failed to fetch assignments from Google Classroom")
+
+@router.get("/cache-stats")
+async def get_classroom_cache_stats():
+    return {**_assignments_cache.stats(), "refreshing": _refreshes.inflight()}
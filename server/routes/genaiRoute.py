@@ -1,93 +1,584 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from typing import Any, Dict, List, Literal, Optional
 import os
+import time
 import asyncio
 import httpx
+from contextlib import aclosing
+import hashlib
 import json
-import re
+import logging
+from responses import FastRoute
+from cache import SharedTTLCache, SingleFlight
+from auth import get_optional_user
+from limiter import SharedTokenBucket, LimiterRejected, PRIORITY_BULK, PRIORITY_INTERACTIVE
+import features
+import metrics
+from jsonextract import JsonScanner, find_json, schema_errors
 
-router = APIRouter()
+router = APIRouter(route_class=FastRoute)
+logger = logging.getLogger(__name__)
 
 # Rate limiter configuration
 MAX_CALLS_PER_MINUTE = 14
-MINUTE_IN_MS = 60 * 1000
-CALL_INTERVAL_MS = (MINUTE_IN_MS + MAX_CALLS_PER_MINUTE - 1) // MAX_CALLS_PER_MINUTE
+# Longest a request may queue for a Gemini slot when the client gives no timeout
+GENAI_MAX_QUEUE_WAIT_S = float(os.getenv("GENAI_MAX_QUEUE_WAIT_S", "120"))
+# Back-off applied to the whole limiter on a 429 without a Retry-After header
+RATE_LIMIT_BACKOFF_S = 10.0
+
+# Prompt-level response cache
+GENAI_CACHE_TTL_S = float(os.getenv("GENAI_CACHE_TTL_S", "600"))
+GENAI_CACHE_MAXSIZE = int(os.getenv("GENAI_CACHE_MAXSIZE", "512"))
+# How long shutdown waits for in-flight Gemini calls before closing the client
+GENAI_DRAIN_TIMEOUT_S = float(os.getenv("GENAI_DRAIN_TIMEOUT_S", "30"))
+
+# Batch generation
+GENAI_BATCH_MAX_ITEMS = int(os.getenv("GENAI_BATCH_MAX_ITEMS", "50"))
+# Only prompts up to this many characters are packed together into one upstream call
+GENAI_PACK_MAX_CHARS = int(os.getenv("GENAI_PACK_MAX_CHARS", "1500"))
+MAX_PACKED_OUTPUT_TOKENS = 8192
+
+# Re-asks, quoting what was wrong, when JSON output is malformed or breaks the caller's schema
+GENAI_JSON_REPAIR_ATTEMPTS = int(os.getenv("GENAI_JSON_REPAIR_ATTEMPTS", "1"))
+# Problems quoted back to the model in a repair prompt
+GENAI_JSON_MAX_PROBLEMS = 10
+
+# Overridable so load tests can point at a local stand-in
+GEMINI_API_URL = os.getenv("GEMINI_API_URL", "https://generativelanguage.googleapis.com").rstrip("/")
 
 _api_key = os.getenv("GEMINI_API_KEY") or os.getenv("NEXT_PUBLIC_GEMINI_API_KEY")
-if not _api_key:
-    raise RuntimeError("Missing Gemini API key. Please add GEMINI_API_KEY (or NEXT_PUBLIC_GEMINI_API_KEY) to your environment")
+# Without a key the rest of the API still runs; generation endpoints answer 503
+gemini = features.env_feature("gemini", "GEMINI_API_KEY", "NEXT_PUBLIC_GEMINI_API_KEY")
+
+# Shared quota for all Gemini calls (across workers under serve.py), and one keep-alive client to make them with
+_limiter = SharedTokenBucket("gemini", MAX_CALLS_PER_MINUTE, 60.0)
+_http_client: Optional[httpx.AsyncClient] = None
+
+_PRIORITIES = {"interactive": PRIORITY_INTERACTIVE, "bulk": PRIORITY_BULK}
+
+_response_cache = SharedTTLCache("genai", GENAI_CACHE_MAXSIZE, GENAI_CACHE_TTL_S)
+_inflight = SingleFlight()
+
+
+def _queue_depths():
+    depths = _limiter.stats()["queue_depth_by_priority"]
+    return [({"priority": name}, depths.get(value, 0)) for name, value in _PRIORITIES.items()]
+
+
+metrics.register_cache("genai_response", _response_cache.stats)
+metrics.register_gauge("genai_limiter_queue_depth", "Requests queued for a Gemini slot, by priority.", _queue_depths)
+metrics.register_gauge("genai_limiter_tokens", "Gemini calls that could start right now.", lambda: _limiter.stats()["tokens"])
+metrics.register_gauge("genai_limiter_granted_total", "Gemini slots handed out.", lambda: _limiter.granted, kind="counter")
+metrics.register_gauge("genai_limiter_rejected_total", "Requests turned away by the Gemini limiter.", lambda: _limiter.rejected, kind="counter")
 
-# Simple globals to enforce spacing between calls
-_last_call_time = 0
-_lock = asyncio.Lock()
 
 class GenerationRequest(BaseModel):
     prompt: str
     isJson: bool = True
+    temperature: float = 0.2
+    maxOutputTokens: int = 1024
+    # Interactive chat is served ahead of bulk work such as quiz generation
+    priority: Literal["interactive", "bulk"] = "interactive"
+    # Client-side timeout; requests that could not be served in time are rejected up front
+    timeoutMs: Optional[int] = None
+    # JSON schema the output must match; implies isJson
+    jsonSchema: Optional[Dict[str, Any]] = None
+
+
+class BatchItem(BaseModel):
+    prompt: str
+    isJson: bool = True
 
 
-def _extract_json_from_text(text: str) -> str:
-    # Try to find a ```json ... ``` block
-    m = re.search(r"```json\s*(.*?)```", text, re.S | re.I)
-    if m:
-        return m.group(1).strip()
-    # fallback: try to find a JSON object / array in the text
-    m2 = re.search(r"(\{[\s\S]*\}|\[[\s\S]*\])", text)
-    if m2:
-        return m2.group(1).strip()
-    return text.strip()
+class BatchGenerationRequest(BaseModel):
+    items: List[BatchItem]
+    temperature: float = 0.2
+    maxOutputTokens: int = 1024
+    priority: Literal["interactive", "bulk"] = "bulk"
+    timeoutMs: Optional[int] = None
+    # Send up to packSize short prompts per upstream call and split the answers back out
+    pack: bool = False
+    packSize: int = 5
 
 
-async def _rate_limit_safe():
-    global _last_call_time
-    async with _lock:
-        now = int(asyncio.get_event_loop().time() * 1000)
-        time_since_last = now - _last_call_time
-        if time_since_last < CALL_INTERVAL_MS:
-            wait_ms = CALL_INTERVAL_MS - time_since_last
-            await asyncio.sleep(wait_ms / 1000.0)
-        _last_call_time = int(asyncio.get_event_loop().time() * 1000)
+def _cache_key(prompt: str, is_json: bool, temperature: float, max_output_tokens: int, schema: Optional[dict] = None) -> str:
+    normalized = " ".join(prompt.split())
+    key = [normalized, is_json, temperature, max_output_tokens]
+    if schema is not None:
+        key.append(schema)
+    raw = json.dumps(key, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
 
-async def _call_gemini(prompt: str) -> str:
-    # Endpoint using Generative Language API (REST key-based)
-    endpoint = (
-        "https://generativelanguage.googleapis.com/v1beta2/models/gemini-2.0-flash-lite-001:generate"
+class InvalidJsonOutput(Exception):
+    """Output that should have been JSON didn't parse or didn't match the requested schema."""
+
+    def __init__(self, output_text: str, problems: List[str]):
+        super().__init__("; ".join(problems))
+        self.output_text = output_text
+        self.problems = problems
+
+
+def _gemini_operation(request: httpx.Request) -> str:
+    # ".../models/<model>:generate" -> "generate"
+    return request.url.path.rsplit(":", 1)[-1]
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(timeout=30.0, transport=metrics.instrumented_transport("gemini", _gemini_operation))
+    return _http_client
+
+
+async def drain():
+    """On shutdown, let Gemini calls whose callers already went away finish and fill the cache."""
+    left = await _inflight.wait_idle(GENAI_DRAIN_TIMEOUT_S)
+    if left:
+        logger.warning("Gemini calls still running at shutdown", extra={"inflight": left})
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def _caller_id(request: Request, user: Optional[dict]) -> str:
+    """Fair-share lane: the verified session, else the client address. Nothing the client can pick."""
+    if user:
+        return f"user:{user['sub']}"
+    return f"ip:{request.client.host}" if request.client else "anonymous"
+
+
+def _retry_after_seconds(response: httpx.Response) -> float:
+    try:
+        return max(0.0, float(response.headers.get("retry-after", "")))
+    except ValueError:
+        return RATE_LIMIT_BACKOFF_S
+
+
+async def _retry_after_error(exc: Exception, attempt: int, max_retries: int) -> int:
+    """Shared retry policy for Gemini calls.
+
+    Backs off as needed and returns the attempt counter to continue the retry
+    loop with. Raises HTTPException for non-retryable upstream errors and
+    re-raises ``exc`` once retries are exhausted.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        if status == 429:
+            # Pause the shared limiter so every queued call backs off, then requeue
+            # without consuming an attempt
+            _limiter.backoff(_retry_after_seconds(exc.response))
+            return attempt - 1
+        if status in (503, 502) and attempt < max_retries:
+            await asyncio.sleep(5 * attempt)
+            return attempt
+        raise HTTPException(status_code=502, detail={"error": "Gemini API error", "status": status, "body": exc.response.text})
+    if attempt >= max_retries:
+        raise exc
+    await asyncio.sleep(2 * attempt)
+    return attempt
+
+
+def _validated_json(output_text: str, schema: Optional[dict] = None, found: Optional[tuple] = None) -> str:
+    """Return the JSON in output_text, checked against ``schema``; raise InvalidJsonOutput otherwise.
+
+    ``found`` is a (source, value) pair already located by a JsonScanner.
+    """
+    found = found or find_json(output_text)
+    if found is None:
+        raise InvalidJsonOutput(output_text, ["$: no complete JSON value found in the reply; it may have been cut off"])
+    source, value = found
+    if schema is not None:
+        problems = schema_errors(value, schema)
+        if problems:
+            raise InvalidJsonOutput(source, problems)
+    return source
+
+
+def _repair_prompt(prompt: str, exc: InvalidJsonOutput, schema: Optional[dict]) -> str:
+    """The original prompt plus the rejected reply and exactly what was wrong with it."""
+    problems = "\n".join(f"- {problem}" for problem in exc.problems[:GENAI_JSON_MAX_PROBLEMS])
+    instruction = "Reply again with only the corrected JSON value"
+    if schema is not None:
+        instruction += f", matching this JSON schema: {json.dumps(schema)}"
+    return f"{prompt}\n\nYour previous reply was:\n{exc.output_text}\n\nIt was rejected because:\n{problems}\n\n{instruction}."
+
+
+def _invalid_json_error(exc: InvalidJsonOutput) -> HTTPException:
+    return HTTPException(
+        status_code=502,
+        detail={"error": "Could not extract valid JSON from Gemini response", "problems": exc.problems[:GENAI_JSON_MAX_PROBLEMS]},
     )
+
+
+async def _call_gemini(prompt: str, temperature: float = 0.2, max_output_tokens: int = 1024) -> str:
+    # Endpoint using Generative Language API (REST key-based)
+    endpoint = f"{GEMINI_API_URL}/v1beta2/models/gemini-2.0-flash-lite-001:generate"
     params = {"key": _api_key}
 
     payload = {
         "prompt": {"text": prompt},
-        "temperature": 0.2,
-        "maxOutputTokens": 1024,
+        "temperature": temperature,
+        "maxOutputTokens": max_output_tokens,
+    }
+
+    resp = await _get_http_client().post(endpoint, params=params, json=payload, timeout=30.0)
+    resp.raise_for_status()
+    return resp.text
+
+
+async def _stream_gemini(prompt: str, temperature: float = 0.2, max_output_tokens: int = 1024):
+    """Yield text deltas from Gemini's server-sent-events streaming endpoint."""
+    endpoint = f"{GEMINI_API_URL}/v1beta/models/gemini-2.0-flash-lite-001:streamGenerateContent"
+    params = {"key": _api_key, "alt": "sse"}
+
+    payload = {
+        "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+        "generationConfig": {"temperature": temperature, "maxOutputTokens": max_output_tokens},
+    }
+
+    async with _get_http_client().stream("POST", endpoint, params=params, json=payload, timeout=30.0) as resp:
+        if resp.status_code >= 400:
+            await resp.aread()
+            resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            chunk = json.loads(line[len("data:"):])
+            candidates = chunk.get("candidates") or [{}]
+            # Only the first candidate is forwarded, matching generate
+            for part in (candidates[0].get("content") or {}).get("parts") or []:
+                if part.get("text"):
+                    yield part["text"]
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _slot(request: Request, user: Optional[dict], priority: str, timeout_ms: Optional[int]) -> dict:
+    """Caller, priority and deadline used to queue a request on the shared limiter."""
+    wait_s = GENAI_MAX_QUEUE_WAIT_S if timeout_ms is None else timeout_ms / 1000.0
+    return {
+        "caller": _caller_id(request, user),
+        "priority": _PRIORITIES[priority],
+        "deadline": time.monotonic() + wait_s,
     }
 
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(endpoint, params=params, json=payload, timeout=30.0)
-        resp.raise_for_status()
-        return resp.text
+
+def _queue_full(exc: LimiterRejected) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Gemini rate limit queue is full, try again later",
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
+
+
+async def _generate_cached(
+    prompt: str, is_json: bool, temperature: float, max_output_tokens: int, slot: dict, schema: Optional[dict] = None
+):
+    """Cached, coalesced _generate. Returns (output_text, ok); ok is False for fallback content."""
+    key = _cache_key(prompt, is_json, temperature, max_output_tokens, schema)
+    cached = await _response_cache.fetch(key)
+    if cached is not None:
+        return cached, True
+
+    led = False
+
+    async def generate_and_cache():
+        nonlocal led
+        led = True
+        output_text, cacheable = await _generate(prompt, is_json, temperature, max_output_tokens, slot, schema)
+        if cacheable:
+            _response_cache.store(key, output_text)
+        return output_text, cacheable
+
+    # Only calls of the same priority share a queue position
+    try:
+        return await _inflight.do((key, slot["priority"]), generate_and_cache)
+    except LimiterRejected:
+        if led:
+            raise
+    # The shared call was turned away on the leader's deadline; queue again on our own
+    return await generate_and_cache()
 
 
-@router.post("/")
-async def generate(req: GenerationRequest):
-    """Generate content from Gemini. POST body: { prompt: string, isJson?: boolean }
+@router.post("/", dependencies=[Depends(gemini.require)])
+async def generate(req: GenerationRequest, request: Request, user: Optional[dict] = Depends(get_optional_user)):
+    """Generate content from Gemini. POST body: { prompt: string, isJson?: boolean, temperature?: number,
+    maxOutputTokens?: number, priority?: "interactive" | "bulk", timeoutMs?: number, jsonSchema?: object }
 
     Returns JSON { result: string } on success or raises HTTPException on error.
+    Identical prompts are answered from a short-lived cache, and concurrent
+    identical prompts share a single upstream call. Requests that would wait
+    longer than timeoutMs for a rate-limit slot get a 429 with Retry-After.
+    JSON output that doesn't parse or match jsonSchema is re-asked for with
+    the problems spelled out; if it still fails the response is a 502.
     """
     prompt = req.prompt
-    is_json = req.isJson
 
     if not prompt or not prompt.strip():
         raise HTTPException(status_code=400, detail="Missing prompt")
 
+    slot = _slot(request, user, req.priority, req.timeoutMs)
+    try:
+        output_text, _ = await _generate_cached(
+            prompt, req.isJson or req.jsonSchema is not None, req.temperature, req.maxOutputTokens, slot, req.jsonSchema
+        )
+    except LimiterRejected as exc:
+        raise _queue_full(exc)
+    return {"result": output_text}
+
+
+@router.post("/stream", dependencies=[Depends(gemini.require)])
+async def generate_stream(req: GenerationRequest, request: Request, user: Optional[dict] = Depends(get_optional_user)):
+    """Stream a Gemini completion as Server-Sent Events. Same body as POST /genai/.
+
+    Emits ``token`` events ({ text }) as partial output arrives, then a final
+    ``result`` event ({ result }) holding the full text, or the validated JSON
+    when isJson is set. JSON replies stop being read once the value closes.
+    If that value doesn't match jsonSchema, a ``retry`` event ({ problems })
+    tells the client to discard the tokens so far before the corrected reply
+    streams in. Failures after the stream has started are reported as an
+    ``error`` event. Retries, rate limiting and caching are shared with /genai/.
+    """
+    prompt = req.prompt
+
+    if not prompt or not prompt.strip():
+        raise HTTPException(status_code=400, detail="Missing prompt")
+
+    is_json = req.isJson or req.jsonSchema is not None
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    key = _cache_key(prompt, is_json, req.temperature, req.maxOutputTokens, req.jsonSchema)
+    cached = await _response_cache.fetch(key)
+    if cached is not None:
+        async def replay():
+            yield _sse("token", {"text": cached})
+            yield _sse("result", {"result": cached})
+        return StreamingResponse(replay(), media_type="text/event-stream", headers=headers)
+
+    slot = _slot(request, user, req.priority, req.timeoutMs)
+
+    # Take the first slot before answering so a full queue still gets a proper 429
+    try:
+        await _limiter.acquire(slot["caller"], slot["priority"], slot["deadline"])
+    except LimiterRejected as exc:
+        raise _queue_full(exc)
+
+    async def events():
+        max_retries = 3
+        have_slot = True
+        current_prompt = prompt
+        for repair in range(GENAI_JSON_REPAIR_ATTEMPTS + 1):
+            attempt = 0
+            parts = []
+            scanner = JsonScanner() if is_json else None
+            while attempt < max_retries:
+                attempt += 1
+                try:
+                    if not have_slot:
+                        await _limiter.acquire(slot["caller"], slot["priority"], slot["deadline"])
+                    have_slot = False
+                    async with aclosing(_stream_gemini(current_prompt, req.temperature, req.maxOutputTokens)) as stream:
+                        async for text in stream:
+                            parts.append(text)
+                            yield _sse("token", {"text": text})
+                            # Anything after the closing bracket is commentary; stop paying for it
+                            if scanner is not None and scanner.feed(text):
+                                break
+                    break
+                except Exception as exc:
+                    # Output already sent can't be taken back, so only retry before the first token
+                    if parts or isinstance(exc, LimiterRejected):
+                        logger.warning("Gemini stream failed", extra={"error": repr(exc), "tokens_sent": len(parts)})
+                        yield _sse("error", {"error": str(exc) or type(exc).__name__})
+                        return
+                    try:
+                        attempt = await _retry_after_error(exc, attempt, max_retries)
+                    except HTTPException as http_exc:
+                        yield _sse("error", {"error": http_exc.detail})
+                        return
+                    except Exception:
+                        yield _sse("error", {"error": "service_unavailable"})
+                        return
+            else:
+                yield _sse("error", {"error": "service_unavailable"})
+                return
+
+            output_text = "".join(parts).strip()
+            if not is_json:
+                break
+            try:
+                found = (scanner.text, scanner.value) if scanner.done else None
+                output_text = _validated_json(output_text, req.jsonSchema, found)
+                break
+            except InvalidJsonOutput as exc:
+                if repair == GENAI_JSON_REPAIR_ATTEMPTS:
+                    yield _sse("error", {"error": _invalid_json_error(exc).detail})
+                    return
+                logger.info("Gemini JSON rejected, asking again", extra={"problems": exc.problems[:GENAI_JSON_MAX_PROBLEMS]})
+                yield _sse("retry", {"problems": exc.problems[:GENAI_JSON_MAX_PROBLEMS]})
+                current_prompt = _repair_prompt(prompt, exc, req.jsonSchema)
+        _response_cache.store(key, output_text)
+        yield _sse("result", {"result": output_text})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+
+@router.post("/batch", dependencies=[Depends(gemini.require)])
+async def generate_batch(req: BatchGenerationRequest, request: Request, user: Optional[dict] = Depends(get_optional_user)):
+    """Generate many prompts in one request. POST body: { items: [{ prompt, isJson? }], temperature?,
+    maxOutputTokens?, priority? (default "bulk"), timeoutMs?, pack?, packSize? }
+
+    Items run concurrently through the same cache and rate limiter as /genai/.
+    With pack set, short prompts are sent packSize at a time in one upstream
+    call; a packed answer that can't be split is retried one prompt per call.
+    Returns { results: [...] } in item order, each with its own error flag and
+    status, so one failed item does not fail the batch.
+    """
+    if not req.items:
+        raise HTTPException(status_code=400, detail="Missing items")
+    if len(req.items) > GENAI_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {GENAI_BATCH_MAX_ITEMS} items per batch")
+
+    slot = _slot(request, user, req.priority, req.timeoutMs)
+    results: List[Optional[dict]] = [None] * len(req.items)
+
+    async def run_single(index: int):
+        item = req.items[index]
+        if not item.prompt or not item.prompt.strip():
+            results[index] = _batch_error(index, 400, "Missing prompt")
+            return
+        try:
+            output_text, ok = await _generate_cached(item.prompt, item.isJson, req.temperature, req.maxOutputTokens, slot)
+        except Exception as exc:
+            results[index] = _batch_exception(index, exc)
+            return
+        results[index] = _batch_ok(index, output_text) if ok else _batch_error(index, 503, "Gemini API unavailable")
+
+    async def run_packed(indices: List[int]):
+        items = [req.items[i] for i in indices]
+        try:
+            answers = await _generate_packed(items, req.temperature, req.maxOutputTokens, slot)
+        except Exception as exc:
+            for index in indices:
+                results[index] = _batch_exception(index, exc)
+            return
+        if answers is None:
+            await asyncio.gather(*(run_single(index) for index in indices))
+            return
+        for index, item, answer in zip(indices, items, answers):
+            _response_cache.store(_cache_key(item.prompt, item.isJson, req.temperature, req.maxOutputTokens), answer)
+            results[index] = _batch_ok(index, answer)
+
+    singles = list(range(len(req.items)))
+    groups: List[List[int]] = []
+    if req.pack and req.packSize > 1:
+        packable = [
+            i for i, item in enumerate(req.items)
+            if item.prompt.strip() and len(item.prompt) <= GENAI_PACK_MAX_CHARS
+        ]
+        groups = [packable[i:i + req.packSize] for i in range(0, len(packable), req.packSize)]
+        groups = [group for group in groups if len(group) > 1]
+        packed = {index for group in groups for index in group}
+        singles = [i for i in singles if i not in packed]
+
+    await asyncio.gather(*(run_single(i) for i in singles), *(run_packed(group) for group in groups))
+    return {"results": results}
+
+
+def _batch_ok(index: int, output_text: str) -> dict:
+    return {"index": index, "error": False, "status": 200, "result": output_text}
+
+
+def _batch_error(index: int, status: int, detail) -> dict:
+    return {"index": index, "error": True, "status": status, "detail": detail}
+
+
+def _batch_exception(index: int, exc: Exception) -> dict:
+    if isinstance(exc, LimiterRejected):
+        return _batch_error(index, 429, str(exc))
+    if isinstance(exc, HTTPException):
+        return _batch_error(index, exc.status_code, exc.detail)
+    return _batch_error(index, 500, str(exc))
+
+
+def _pack_prompt(prompts: List[str]) -> str:
+    n = len(prompts)
+    header = (
+        f"You will be given {n} independent tasks. Answer each task on its own, as if it had been asked alone. "
+        f"Reply with only a JSON array of exactly {n} elements in task order, where element i is the complete "
+        "answer to task i: a JSON value if that task asks for JSON, otherwise a string."
+    )
+    tasks = "".join(f"\n\n### Task {i}\n{prompt.strip()}" for i, prompt in enumerate(prompts, start=1))
+    return header + tasks
+
+
+async def _generate_packed(items: List[BatchItem], temperature: float, max_output_tokens: int, slot: dict):
+    """Answer several prompts with one upstream call.
+
+    Returns one answer per item, or None if the reply could not be split back
+    out. Raises HTTPException(503) if Gemini was unavailable.
+    """
+    packed_tokens = min(MAX_PACKED_OUTPUT_TOKENS, max_output_tokens * len(items))
+    try:
+        output_text, ok = await _generate_cached(
+            _pack_prompt([item.prompt for item in items]), True, temperature, packed_tokens, slot
+        )
+    except HTTPException as exc:
+        if exc.status_code == 502:
+            # No usable JSON even after a repair; answer the prompts one by one
+            return None
+        raise
+    if not ok:
+        raise HTTPException(status_code=503, detail="Gemini API unavailable")
+
+    try:
+        values = json.loads(output_text)
+    except Exception:
+        return None
+    if not isinstance(values, list) or len(values) != len(items):
+        return None
+
+    answers = []
+    for item, value in zip(items, values):
+        if not isinstance(value, str):
+            answers.append(json.dumps(value))
+            continue
+        if item.isJson:
+            try:
+                value = _validated_json(value)
+            except InvalidJsonOutput:
+                return None
+        answers.append(value.strip())
+    return answers
+
+
+async def _generate(
+    prompt: str, is_json: bool, temperature: float, max_output_tokens: int, slot: dict, schema: Optional[dict] = None
+):
+    """Run the retrying Gemini call. Returns (output_text, cacheable); fallbacks are not cacheable.
+
+    ``slot`` holds the caller, priority and deadline used to queue on the shared limiter.
+    Invalid JSON is re-asked for with a repair prompt rather than retried blindly, and
+    raises a 502 once GENAI_JSON_REPAIR_ATTEMPTS are used up.
+    """
     max_retries = 3
     attempt = 0
+    repairs = 0
+    current_prompt = prompt
 
     while attempt < max_retries:
         attempt += 1
         try:
-            await _rate_limit_safe()
-            raw_text = await _call_gemini(prompt)
+            await _limiter.acquire(slot["caller"], slot["priority"], slot["deadline"])
+            raw_text = await _call_gemini(current_prompt, temperature, max_output_tokens)
 
             # Try to extract text content from the response body
             try:
@@ -121,49 +612,48 @@ async def generate(req: GenerationRequest):
                         output_text = parsed.get("text")
 
             if output_text is None:
-                # Try to extract from raw_text using regex or return raw_text
-                extracted = _extract_json_from_text(raw_text)
-                output_text = extracted
+                # Not a response envelope: use the JSON in the body, or the body itself
+                found = find_json(raw_text)
+                output_text = found[0] if found else raw_text
 
             output_text = output_text.strip() if isinstance(output_text, str) else str(output_text)
 
             if is_json:
-                # Validate that output_text is valid JSON or try extraction from markdown
-                try:
-                    json.loads(output_text)
-                except Exception:
-                    maybe = _extract_json_from_text(output_text)
-                    try:
-                        json.loads(maybe)
-                        output_text = maybe
-                    except Exception:
-                        raise HTTPException(status_code=502, detail="Could not extract valid JSON from Gemini response")
+                output_text = _validated_json(output_text, schema)
 
-            return {"result": output_text}
+            return output_text, True
 
+        except InvalidJsonOutput as exc:
+            if repairs >= GENAI_JSON_REPAIR_ATTEMPTS:
+                raise _invalid_json_error(exc)
+            logger.info("Gemini JSON rejected, asking again", extra={"problems": exc.problems[:GENAI_JSON_MAX_PROBLEMS]})
+            repairs += 1
+            # A repair is a new question, not a failed call
+            attempt -= 1
+            current_prompt = _repair_prompt(prompt, exc, schema)
         except httpx.HTTPStatusError as exc:
-            status = exc.response.status_code
-            text = exc.response.text
-            # Rate limit or server errors: retry with backoff
-            if status == 429:
-                # Wait and retry without consuming an attempt
-                await asyncio.sleep(10.0)
-                attempt -= 1
-                continue
-            if status in (503, 502):
-                if attempt < max_retries:
-                    await asyncio.sleep(5 * attempt)
-                    continue
-            raise HTTPException(status_code=502, detail={"error": "Gemini API error", "status": status, "body": text})
+            attempt = await _retry_after_error(exc, attempt, max_retries)
+        except LimiterRejected:
+            raise
         except Exception as exc:
-            # If we've exhausted retries, return a fallback
-            if attempt >= max_retries:
+            try:
+                attempt = await _retry_after_error(exc, attempt, max_retries)
+            except Exception:
+                # Retries exhausted: return a fallback
+                logger.warning("Gemini retries exhausted, serving fallback", extra={"error": repr(exc), "attempts": attempt})
                 if is_json:
-                    return {"result": json.dumps({"error": "service_unavailable", "message": "Gemini API unavailable. Using fallback content."})}
+                    return json.dumps({"error": "service_unavailable", "message": "Gemini API unavailable. Using fallback content."}), False
                 else:
-                    return {"result": "I apologize, but the AI service is currently unavailable. Please try again later."}
-            # Otherwise wait and retry
-            await asyncio.sleep(2 * attempt)
-            continue
+                    return "I apologize, but the AI service is currently unavailable. Please try again later.", False
 
     raise HTTPException(status_code=500, detail="Unexpected error in generation loop")
+
+
+@router.get("/cache-stats")
+async def get_genai_cache_stats():
+    return {**_response_cache.stats(), "inflight": _inflight.inflight()}
+
+
+@router.get("/limiter-stats")
+async def get_genai_limiter_stats():
+    return _limiter.stats()
@@ -1,40 +1,108 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException
+from typing import List, Optional
+import hashlib
 import os
+import time
 import uuid
 import httpx
+from jose import jwt
+from responses import FastRoute
+from cache import SharedTTLCache, SingleFlight
+import features
+import metrics
+from auth import get_optional_user
+from models.liveblocksModel import liveblocksAuthReqMod
 
-router = APIRouter()
+router = APIRouter(route_class=FastRoute)
 
 # Liveblocks secret key from environment variable
 LIVEBLOCKS_SECRET = os.getenv("LIVEBLOCKS_SECRET_KEY")
+liveblocks = features.env_feature("liveblocks", "LIVEBLOCKS_SECRET_KEY")
 # Allow overriding the Liveblocks API URL via env var (useful for testing)
 # Default to the correct v2 authorize URL
 LIVEBLOCKS_API = os.getenv("LIVEBLOCKS_API_URL", "https://api.liveblocks.io/v2/authorize-user")
+# Room used when the client doesn't name one
+LIVEBLOCKS_DEFAULT_ROOM = os.getenv("LIVEBLOCKS_DEFAULT_ROOM", "my-room")
+# Rooms open to everyone; any other room needs a signed-in user
+LIVEBLOCKS_PUBLIC_ROOMS = {r.strip() for r in os.getenv("LIVEBLOCKS_PUBLIC_ROOMS", LIVEBLOCKS_DEFAULT_ROOM).split(",") if r.strip()}
+# Whether callers without a session may join public rooms, and with what access
+LIVEBLOCKS_ALLOW_ANONYMOUS = os.getenv("LIVEBLOCKS_ALLOW_ANONYMOUS", "1") == "1"
+LIVEBLOCKS_ANONYMOUS_PERMISSIONS = [
+    p.strip() for p in os.getenv("LIVEBLOCKS_ANONYMOUS_PERMISSIONS", "room:read,room:presence:write").split(",") if p.strip()
+]
+# The community page joins the default room without a session and posts to it, so
+# anonymous callers keep write access there until the client signs its requests
+LIVEBLOCKS_ANONYMOUS_WRITE_DEFAULT_ROOM = os.getenv("LIVEBLOCKS_ANONYMOUS_WRITE_DEFAULT_ROOM", "1") == "1"
+# Issued tokens are reused until this many seconds before they expire
+LIVEBLOCKS_TOKEN_REFRESH_MARGIN_S = float(os.getenv("LIVEBLOCKS_TOKEN_REFRESH_MARGIN_S", "120"))
+# Lifetime assumed when a token's expiry can't be read
+LIVEBLOCKS_TOKEN_TTL_S = float(os.getenv("LIVEBLOCKS_TOKEN_TTL_S", "3600"))
+LIVEBLOCKS_TOKEN_CACHE_SIZE = int(os.getenv("LIVEBLOCKS_TOKEN_CACHE_SIZE", "4096"))
+MAX_ROOM_ID_LENGTH = 128
 
-@router.post("/auth")
-async def auth():
-    """Create a short-lived Liveblocks authentication token for an anonymous user.
+_MEMBER_PERMISSIONS = ["room:write"]
+_COLORS = ["#D583F0", "#F08385", "#F0D885", "#85EED6", "#85BBF0", "#8594F0", "#85DBF0", "#87EE85"]
 
-    This endpoint proxies the Liveblocks /v2/authorize API using the secret key stored in
-    the environment. It returns the JSON response from Liveblocks directly.
-    """
-    if not LIVEBLOCKS_SECRET:
-        raise HTTPException(status_code=500, detail="Liveblocks secret not configured")
+_http_client: Optional[httpx.AsyncClient] = None
+_tokens = SharedTTLCache("liveblocks", LIVEBLOCKS_TOKEN_CACHE_SIZE, LIVEBLOCKS_TOKEN_TTL_S)
+_issuing = SingleFlight()
 
-    user_id = str(uuid.uuid4())
+metrics.register_cache("liveblocks_tokens", _tokens.stats)
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=10.0,
+            transport=metrics.instrumented_transport(
+                "liveblocks",
+                lambda request: "authorize",
+                http2=True,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            ),
+        )
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+def _room_permissions(user: Optional[dict], room: str) -> List[str]:
+    """Members may write to any room; anonymous callers are limited to public rooms."""
+    if user is not None:
+        return _MEMBER_PERMISSIONS
+    if LIVEBLOCKS_ALLOW_ANONYMOUS and room == LIVEBLOCKS_DEFAULT_ROOM and LIVEBLOCKS_ANONYMOUS_WRITE_DEFAULT_ROOM:
+        return _MEMBER_PERMISSIONS
+    if LIVEBLOCKS_ALLOW_ANONYMOUS and room in LIVEBLOCKS_PUBLIC_ROOMS:
+        return LIVEBLOCKS_ANONYMOUS_PERMISSIONS
+    raise HTTPException(status_code=401, detail="Sign in to join this room", headers={"WWW-Authenticate": "Bearer"})
 
+def _color(user_id: str) -> str:
+    return _COLORS[hashlib.sha256(user_id.encode()).digest()[0] % len(_COLORS)]
+
+def _cache_ttl(body: dict) -> float:
+    """Seconds to reuse a token: until shortly before its ``exp`` claim."""
+    try:
+        expires_at = jwt.get_unverified_claims(body.get("token", "")).get("exp")
+    except Exception:
+        expires_at = None
+    lifetime = expires_at - time.time() if expires_at else LIVEBLOCKS_TOKEN_TTL_S
+    return lifetime - LIVEBLOCKS_TOKEN_REFRESH_MARGIN_S
+
+async def _authorize(user_id: str, user_info: dict, room: str, permissions: List[str]) -> dict:
     # v2-style payload for Liveblocks /v2/authorize
     payload = {
         "userId": user_id,
-        "userInfo": {"name": f"anon-{user_id[:8]}", "color": "#D583F0"},
-        "permissions": {"my-room": ["room:write"]},
+        "userInfo": user_info,
+        "permissions": {room: permissions},
     }
 
     headers = {"Authorization": f"Bearer {LIVEBLOCKS_SECRET}"}
 
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(LIVEBLOCKS_API, json=payload, headers=headers, timeout=10.0)
+        resp = await _get_http_client().post(LIVEBLOCKS_API, json=payload, headers=headers)
     except httpx.RequestError as exc:
         raise HTTPException(status_code=502, detail={"error": f"Failed to connect to Liveblocks: {str(exc)}"})
 
@@ -50,4 +118,52 @@ async def auth():
         body = resp.json()
     except Exception:
         body = resp.text
-    raise HTTPException(status_code=502, detail={"error": {"endpoint": LIVEBLOCKS_API, "status": resp.status_code, "body": body}})
\ No newline at end of file
+    raise HTTPException(status_code=502, detail={"error": {"endpoint": LIVEBLOCKS_API, "status": resp.status_code, "body": body}})
+
+async def _cached_token(user_id: str, user_info: dict, room: str, permissions: List[str]) -> dict:
+    key = (user_id, room, tuple(permissions))
+    cached = await _tokens.fetch(key)
+    if cached is not None:
+        return cached
+
+    async def issue():
+        body = await _authorize(user_id, user_info, room, permissions)
+        ttl = _cache_ttl(body)
+        if "token" in body and ttl > 0:
+            _tokens.store(key, body, ttl=ttl)
+        return body
+
+    # A whole class joining at once shares one upstream call per (user, room)
+    return await _issuing.do(key, issue)
+
+@router.post("/auth", dependencies=[Depends(liveblocks.require)])
+async def auth(req: Optional[liveblocksAuthReqMod] = Body(None), user: Optional[dict] = Depends(get_optional_user)):
+    """Issue a Liveblocks access token for the caller, scoped to the requested room.
+
+    Signed-in users are identified by their session and get write access.
+    Anonymous callers, if allowed, get write access to the default room and
+    LIVEBLOCKS_ANONYMOUS_PERMISSIONS (read-only by default) on other public
+    rooms, under the per-browser ``anonymous_id`` they send or else a
+    throwaway identity. Tokens for a session or anonymous_id are cached until
+    shortly before expiry.
+    """
+    room = (req.room if req and req.room else LIVEBLOCKS_DEFAULT_ROOM)
+    if len(room) > MAX_ROOM_ID_LENGTH:
+        raise HTTPException(status_code=400, detail="Room id is too long")
+    permissions = _room_permissions(user, room)
+
+    if user is not None:
+        user_id = user["sub"]
+        user_info = {"name": user.get("username") or f"user-{user_id[:8]}", "color": _color(user_id)}
+        return await _cached_token(user_id, user_info, room, permissions)
+
+    if req and req.anonymous_id:
+        user_id = f"anon-{req.anonymous_id}"
+        return await _cached_token(user_id, {"name": user_id[:13], "color": _color(user_id)}, room, permissions)
+
+    user_id = str(uuid.uuid4())
+    return await _authorize(user_id, {"name": f"anon-{user_id[:8]}", "color": "#D583F0"}, room, permissions)
+
+@router.get("/cache-stats")
+async def get_liveblocks_cache_stats():
+    return {**_tokens.stats(), "inflight": _issuing.inflight()}
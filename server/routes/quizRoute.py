@@ -1,39 +1,43 @@
-from fastapi import APIRouter, HTTPException
-from supabase import create_client, Client
-import os
+from fastapi import APIRouter, Depends, HTTPException
+from postgrest import AsyncPostgrestClient
+from responses import FastRoute
+from db import get_db, insert_unique, AlreadyExists
+from quizstore import pack_quiz, unpack_quiz, select_questions
 from models.quizModel import quizReqMod, quizGetReqMod, quizResMod
 
-router = APIRouter()
-
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+router = APIRouter(route_class=FastRoute)
 
 @router.post("/add", response_model=quizResMod)
-async def add_quiz(req: quizReqMod):
+async def add_quiz(req: quizReqMod, supabase: AsyncPostgrestClient = Depends(get_db)):
     try:
-        # Check if quiz_id already exists
-        response = supabase.table("quiz").select("quiz_id").eq("quiz_id", req.quiz_id).execute()
-        if response.data:
-            return {"error": True, "message": "Quiz ID already exists", "quiz_data": {}}
-        
-        # Insert new quiz data
-        response = supabase.table("quiz").insert({
+        packed = pack_quiz(req.quiz_data.model_dump(exclude_none=True))
+        await insert_unique(supabase, "quiz", {
             "quiz_id": req.quiz_id,
-            "quiz_data": req.quiz_data
-        }).execute()
+            **packed
+        }, on_conflict="quiz_id")
         
-        return {"error": False, "message": "Quiz added successfully", "quiz_data": {}}
+        return {"error": False, "message": "Quiz added successfully", "quiz_data": {}, "content_hash": packed["content_hash"]}
+    except AlreadyExists:
+        return {"error": True, "message": "Quiz ID already exists", "quiz_data": {}}
     except Exception as e:
         return {"error": True, "message": f"Failed to add quiz: {str(e)}", "quiz_data": {}}
 
 @router.post("/get", response_model=quizResMod)
-async def get_quiz(req: quizGetReqMod):
+async def get_quiz(req: quizGetReqMod, supabase: AsyncPostgrestClient = Depends(get_db)):
     try:
-        response = supabase.table("quiz").select("quiz_data").eq("quiz_id", req.quiz_id).single().execute()
+        response = await supabase.table("quiz").select("quiz_data, quiz_blob, content_hash").eq("quiz_id", req.quiz_id).limit(1).execute()
         if not response.data:
             return {"error": True, "message": "Quiz not found", "quiz_data": {}}
         
-        return {"error": False, "message": "Quiz retrieved successfully", "quiz_data": response.data["quiz_data"]}
+        header, questions, digest = unpack_quiz(response.data[0])
+        if req.known_hash == digest:
+            return {"error": False, "message": "Quiz not modified", "quiz_data": {}, "content_hash": digest, "not_modified": True}
+        
+        quiz_data = {
+            **header,
+            "start": req.start,
+            "questions": select_questions(questions, req.start, req.end, req.stems_only)
+        }
+        return {"error": False, "message": "Quiz retrieved successfully", "quiz_data": quiz_data, "content_hash": digest}
     except Exception as e:
         return {"error": True, "message": f"Failed to retrieve quiz: {str(e)}", "quiz_data": {}}
\ No newline at end of file
@@ -1,69 +1,93 @@
-from fastapi import APIRouter
-from supabase import create_client, Client
-import os
+from fastapi import APIRouter, Depends
+from postgrest import AsyncPostgrestClient
+from responses import FastRoute
+from db import get_db, insert_unique, AlreadyExists
+from listing import KeysetListing, ListParams
 from models.studentSubjectModel import (
     studentSubjectAddReqMod, 
     studentSubjectGetReqMod, 
     studentSubjectUpdateReqMod, 
     studentSubjectDelReqMod, 
+    studentSubjectSessionReqMod,
     studentSubjectResMod
 )
 
-router = APIRouter()
+router = APIRouter(route_class=FastRoute)
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+student_subject_listing = KeysetListing(
+    "student_subject", "subject_id", ("student_id", "subject_id", "attendance", "attended", "sessions")
+)
 
 @router.post("/add", response_model=studentSubjectResMod)
-async def add_student_subject(req: studentSubjectAddReqMod):
+async def add_student_subject(req: studentSubjectAddReqMod, supabase: AsyncPostgrestClient = Depends(get_db)):
     try:
-        # Check if relationship already exists
-        response = supabase.table("student_subject").select("*").eq("student_id", req.student_id).eq("subject_id", req.subject_id).execute()
-        if response.data:
-            return {"error": True, "message": "Student-subject relationship already exists", "data": []}
-        
-        # Insert new relationship
-        response = supabase.table("student_subject").insert({
-            "student_id": req.student_id,
-            "subject_id": req.subject_id,
-            "attendance": req.attendance
-        }).execute()
+        row = {"student_id": req.student_id, "subject_id": req.subject_id, "attendance": req.attendance}
+        if req.attendance:
+            # A starting percentage counts as one session, as in set_attendance
+            row.update({"attended": round(req.attendance / 100, 2), "sessions": 1})
+        data = await insert_unique(supabase, "student_subject", row, on_conflict="student_id,subject_id")
         
-        return {"error": False, "message": "Student-subject relationship added successfully", "data": response.data}
+        return {"error": False, "message": "Student-subject relationship added successfully", "data": data}
+    except AlreadyExists:
+        return {"error": True, "message": "Student-subject relationship already exists", "data": []}
     except Exception as e:
         return {"error": True, "message": f"Failed to add student-subject relationship: {str(e)}", "data": []}
 
 @router.post("/get", response_model=studentSubjectResMod)
-async def get_student_subjects(req: studentSubjectGetReqMod):
+async def get_student_subjects(req: studentSubjectGetReqMod, page: ListParams = Depends(), supabase: AsyncPostgrestClient = Depends(get_db)):
     try:
-        response = supabase.table("student_subject").select("*").eq("student_id", req.student_id).execute()
+        if page.requested:
+            return await student_subject_listing.respond(supabase, page, {"student_id": req.student_id}, "Student subjects retrieved successfully")
+        response = await supabase.table("student_subject").select("*").eq("student_id", req.student_id).execute()
         
         return {"error": False, "message": "Student subjects retrieved successfully", "data": response.data}
     except Exception as e:
         return {"error": True, "message": f"Failed to retrieve student subjects: {str(e)}", "data": []}
 
 @router.post("/update", response_model=studentSubjectResMod)
-async def update_student_subject_attendance(req: studentSubjectUpdateReqMod):
+async def update_student_subject_attendance(req: studentSubjectUpdateReqMod, supabase: AsyncPostgrestClient = Depends(get_db)):
     try:
-        # Check if relationship exists
-        check_response = supabase.table("student_subject").select("*").eq("student_id", req.student_id).eq("subject_id", req.subject_id).execute()
-        if not check_response.data:
-            return {"error": True, "message": "Student-subject relationship not found", "data": []}
+        # Rescales the session counters too, so the next mark-session builds on this value
+        response = await supabase.rpc("set_attendance", {
+            "p_student_id": req.student_id,
+            "p_subject_id": req.subject_id,
+            "p_attendance": req.attendance,
+            "p_sessions": req.sessions
+        }).execute()
         
-        # Update attendance
-        response = supabase.table("student_subject").update({
-            "attendance": req.attendance
-        }).eq("student_id", req.student_id).eq("subject_id", req.subject_id).execute()
+        if not response.data:
+            return {"error": True, "message": "Student-subject relationship not found", "data": []}
         
         return {"error": False, "message": "Attendance updated successfully", "data": response.data}
     except Exception as e:
         return {"error": True, "message": f"Failed to update attendance: {str(e)}", "data": []}
 
+@router.post("/mark-session", response_model=studentSubjectResMod)
+async def mark_session_attendance(req: studentSubjectSessionReqMod, supabase: AsyncPostgrestClient = Depends(get_db)):
+    try:
+        present = list(dict.fromkeys(req.present))
+        absent = list(dict.fromkeys(req.absent))
+        both = set(present) & set(absent)
+        if both:
+            return {"error": True, "message": f"Students marked both present and absent: {', '.join(sorted(both))}", "data": []}
+        if not present and not absent:
+            return {"error": True, "message": "No students to mark", "data": []}
+        
+        # One call: the function counts the session for every student and recomputes their percentage
+        response = await supabase.rpc("mark_attendance", {
+            "p_subject_id": req.subject_id,
+            "p_present": present,
+            "p_absent": absent
+        }).execute()
+        
+        return {"error": False, "message": "Attendance marked successfully", "data": response.data}
+    except Exception as e:
+        return {"error": True, "message": f"Failed to mark attendance: {str(e)}", "data": []}
+
 @router.post("/delete", response_model=studentSubjectResMod)
-async def delete_student_subject(req: studentSubjectDelReqMod):
+async def delete_student_subject(req: studentSubjectDelReqMod, supabase: AsyncPostgrestClient = Depends(get_db)):
     try:
-        response = supabase.table("student_subject").delete().eq("student_id", req.student_id).eq("subject_id", req.subject_id).execute()
+        response = await supabase.table("student_subject").delete().eq("student_id", req.student_id).eq("subject_id", req.subject_id).execute()
         
         if not response.data:
             return {"error": True, "message": "Student-subject relationship not found", "data": []}
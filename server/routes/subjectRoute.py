@@ -1,68 +1,92 @@
-from fastapi import APIRouter
-from supabase import create_client, Client
-import os
+from fastapi import APIRouter, Depends, HTTPException, UploadFile
+from postgrest import AsyncPostgrestClient
+from responses import FastRoute
+from db import get_db, insert_unique, AlreadyExists
+from catalog import subject_cache
+from bulkimport import detect_format, import_rows
+from listing import KeysetListing, ListParams
+from models.importModel import importResMod
 from models.subjectModel import subjectReqMod, subjectGetReqMod, subjectGetByBranchReqMod, subjectGetBySemReqMod, subjectResMod
 
-router = APIRouter()
+router = APIRouter(route_class=FastRoute)
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+subject_listing = KeysetListing("subject", "subject_id", ("subject_id", "subject_name", "branch_id", "sem"))
 
 @router.post("/add", response_model=subjectResMod)
-async def add_subject(req: subjectReqMod):
+async def add_subject(req: subjectReqMod, supabase: AsyncPostgrestClient = Depends(get_db)):
     try:
-        # Check if subject_id already exists
-        response = supabase.table("subject").select("subject_id").eq("subject_id", req.subject_id).execute()
-        if response.data:
-            return {"error": True, "message": "Subject ID already exists", "data": []}
-        
-        # Insert new subject
-        response = supabase.table("subject").insert({
+        await insert_unique(supabase, "subject", {
             "subject_id": req.subject_id,
             "subject_name": req.subject_name,
             "branch_id": req.branch_id,
             "sem": req.sem
-        }).execute()
+        }, on_conflict="subject_id")
+        subject_cache.invalidate()
         
         return {"error": False, "message": "Subject added successfully", "data": []}
+    except AlreadyExists:
+        return {"error": True, "message": "Subject ID already exists", "data": []}
     except Exception as e:
         return {"error": True, "message": f"Failed to add subject: {str(e)}", "data": []}
 
 @router.post("/get", response_model=subjectResMod)
-async def get_subject(req: subjectGetReqMod):
+async def get_subject(req: subjectGetReqMod, supabase: AsyncPostgrestClient = Depends(get_db)):
     try:
-        response = supabase.table("subject").select("*").eq("subject_id", req.subject_id).execute()
-        if not response.data:
+        data = await subject_cache.lookup(supabase, "subject_id", req.subject_id)
+        if not data:
             return {"error": True, "message": "Subject not found", "data": []}
         
-        return {"error": False, "message": "Subject retrieved successfully", "data": response.data}
+        return {"error": False, "message": "Subject retrieved successfully", "data": data}
     except Exception as e:
         return {"error": True, "message": f"Failed to retrieve subject: {str(e)}", "data": []}
 
 @router.post("/get-by-branch", response_model=subjectResMod)
-async def get_subjects_by_branch(req: subjectGetByBranchReqMod):
+async def get_subjects_by_branch(req: subjectGetByBranchReqMod, page: ListParams = Depends(), supabase: AsyncPostgrestClient = Depends(get_db)):
     try:
-        response = supabase.table("subject").select("*").eq("branch_id", req.branch_id).execute()
+        if page.requested:
+            return await subject_listing.respond(supabase, page, {"branch_id": req.branch_id}, "Subjects retrieved successfully")
+        data = await subject_cache.lookup(supabase, "branch_id", req.branch_id)
         
-        return {"error": False, "message": "Subjects retrieved successfully", "data": response.data}
+        return {"error": False, "message": "Subjects retrieved successfully", "data": data}
     except Exception as e:
         return {"error": True, "message": f"Failed to retrieve subjects: {str(e)}", "data": []}
 
 @router.post("/get-by-sem", response_model=subjectResMod)
-async def get_subjects_by_semester(req: subjectGetBySemReqMod):
+async def get_subjects_by_semester(req: subjectGetBySemReqMod, page: ListParams = Depends(), supabase: AsyncPostgrestClient = Depends(get_db)):
     try:
-        response = supabase.table("subject").select("*").eq("sem", req.sem).execute()
+        if page.requested:
+            return await subject_listing.respond(supabase, page, {"sem": req.sem}, "Subjects retrieved successfully")
+        data = await subject_cache.lookup(supabase, "sem", req.sem)
         
-        return {"error": False, "message": "Subjects retrieved successfully", "data": response.data}
+        return {"error": False, "message": "Subjects retrieved successfully", "data": data}
     except Exception as e:
         return {"error": True, "message": f"Failed to retrieve subjects: {str(e)}", "data": []}
 
 @router.get("/all", response_model=subjectResMod)
-async def get_all_subjects():
+async def get_all_subjects(page: ListParams = Depends(), supabase: AsyncPostgrestClient = Depends(get_db)):
     try:
-        response = supabase.table("subject").select("*").execute()
+        if page.requested:
+            return await subject_listing.respond(supabase, page, {}, "All subjects retrieved successfully")
+        data = await subject_cache.all(supabase)
         
-        return {"error": False, "message": "All subjects retrieved successfully", "data": response.data}
+        return {"error": False, "message": "All subjects retrieved successfully", "data": data}
+    except Exception as e:
+        return {"error": True, "message": f"Failed to retrieve subjects: {str(e)}", "data": []}
+
+@router.post("/import", response_model=importResMod)
+async def import_subjects(file: UploadFile, supabase: AsyncPostgrestClient = Depends(get_db)):
+    fmt = detect_format(file)
+    if fmt is None:
+        raise HTTPException(status_code=400, detail="File must be CSV or NDJSON")
+    try:
+        result = await import_rows(supabase, file, fmt, "subject", subjectReqMod, key="subject_id")
     except Exception as e:
-        return {"error": True, "message": f"Failed to retrieve subjects: {str(e)}", "data": []}
\ No newline at end of file
+        return {"error": True, "message": f"Failed to import subjects: {str(e)}"}
+    finally:
+        # Rows from earlier chunks may have landed even if a later one failed
+        subject_cache.invalidate()
+    return result
+
+@router.get("/cache-stats")
+async def get_subject_cache_stats():
+    return subject_cache.stats()
\ No newline at end of file
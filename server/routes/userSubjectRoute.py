@@ -1,45 +1,43 @@
-from fastapi import APIRouter
-from supabase import create_client, Client
-import os
+from fastapi import APIRouter, Depends
+from postgrest import AsyncPostgrestClient
+from responses import FastRoute
+from db import get_db, insert_unique, AlreadyExists
+from listing import KeysetListing, ListParams
 from models.userSubjectModel import userSubjectReqMod, userSubjectGetReqMod, userSubjectDelReqMod, userSubjectResMod
 
-router = APIRouter()
+router = APIRouter(route_class=FastRoute)
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+user_subject_listing = KeysetListing("user_subject", "subject_id", ("uid", "subject_id"))
 
 @router.post("/add", response_model=userSubjectResMod)
-async def add_user_subject(req: userSubjectReqMod):
+async def add_user_subject(req: userSubjectReqMod, supabase: AsyncPostgrestClient = Depends(get_db)):
     try:
-        # Check if relationship already exists
-        response = supabase.table("user_subject").select("*").eq("uid", req.uid).eq("subject_id", req.subject_id).execute()
-        if response.data:
-            return {"error": True, "message": "User-subject relationship already exists", "data": []}
-        
-        # Insert new relationship
-        response = supabase.table("user_subject").insert({
+        await insert_unique(supabase, "user_subject", {
             "uid": req.uid,
             "subject_id": req.subject_id
-        }).execute()
+        }, on_conflict="uid,subject_id")
         
         return {"error": False, "message": "User-subject relationship added successfully", "data": []}
+    except AlreadyExists:
+        return {"error": True, "message": "User-subject relationship already exists", "data": []}
     except Exception as e:
         return {"error": True, "message": f"Failed to add user-subject relationship: {str(e)}", "data": []}
 
 @router.post("/get", response_model=userSubjectResMod)
-async def get_user_subjects(req: userSubjectGetReqMod):
+async def get_user_subjects(req: userSubjectGetReqMod, page: ListParams = Depends(), supabase: AsyncPostgrestClient = Depends(get_db)):
     try:
-        response = supabase.table("user_subject").select("*").eq("uid", req.uid).execute()
+        if page.requested:
+            return await user_subject_listing.respond(supabase, page, {"uid": req.uid}, "User subjects retrieved successfully")
+        response = await supabase.table("user_subject").select("*").eq("uid", req.uid).execute()
         
         return {"error": False, "message": "User subjects retrieved successfully", "data": response.data}
     except Exception as e:
         return {"error": True, "message": f"Failed to retrieve user subjects: {str(e)}", "data": []}
 
 @router.post("/delete", response_model=userSubjectResMod)
-async def delete_user_subject(req: userSubjectDelReqMod):
+async def delete_user_subject(req: userSubjectDelReqMod, supabase: AsyncPostgrestClient = Depends(get_db)):
     try:
-        response = supabase.table("user_subject").delete().eq("uid", req.uid).eq("subject_id", req.subject_id).execute()
+        response = await supabase.table("user_subject").delete().eq("uid", req.uid).eq("subject_id", req.subject_id).execute()
         
         if not response.data:
             return {"error": True, "message": "User-subject relationship not found", "data": []}
@@ -0,0 +1,79 @@
+"""Production entry point: python serve.py [--workers N] [--host H] [--port P]
+
+Runs main:app in WEB_CONCURRENCY worker processes behind one listening
+socket. With more than one worker, a coordinator thread in this supervisor
+process shares the Gemini quota, response and token caches and catalog
+invalidations between workers over a Unix socket (see coordinator.py).
+Everything else is per worker: in-memory caches other than those, PDF pool
+slots and the /metrics registry. Each worker labels its series with
+``worker`` (its pid), and a scrape reaches whichever worker accepts the
+connection, so sum or aggregate across that label in queries.
+
+Client addresses come from X-Forwarded-For / X-Forwarded-Proto only when
+the connection is from an address in FORWARDED_ALLOW_IPS (default
+127.0.0.1). The deployment must list its proxy or load balancer addresses
+there (comma-separated, or "*" when nothing but the proxy can reach the
+port); otherwise rate limits and logs see the proxy's address.
+
+On SIGTERM/SIGINT each worker stops accepting connections, waits up to
+GRACEFUL_SHUTDOWN_S for in-flight requests (including streamed Gemini
+responses), then drains detached Gemini calls before closing its clients.
+
+For local development use ``python main.py`` (single process, auto-reload).
+"""
+import argparse
+import os
+import tempfile
+
+import uvicorn
+from dotenv import load_dotenv
+
+from coordinator import CoordinatorThread
+from logconfig import configure_logging
+
+load_dotenv()
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(min(4, os.cpu_count() or 1))))
+GRACEFUL_SHUTDOWN_S = int(os.getenv("GRACEFUL_SHUTDOWN_S", "30"))
+# Proxies trusted to set X-Forwarded-For; list the deployment's proxy addresses here
+FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the API with multiple worker processes.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    parser.add_argument("--graceful-timeout", type=int, default=GRACEFUL_SHUTDOWN_S,
+                        help="seconds to wait for in-flight requests on shutdown")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    coordinator = None
+    with tempfile.TemporaryDirectory(prefix="hackbuild-") as rundir:
+        if args.workers > 1:
+            coordinator = CoordinatorThread(os.path.join(rundir, "coordinator.sock"))
+            coordinator.start()
+            # Inherited by the worker processes
+            os.environ["COORDINATOR_SOCKET"] = coordinator.path
+        try:
+            uvicorn.run(
+                "main:app",
+                host=args.host,
+                port=args.port,
+                workers=args.workers,
+                timeout_graceful_shutdown=args.graceful_timeout,
+                proxy_headers=True,
+                forwarded_allow_ips=FORWARDED_ALLOW_IPS,
+                # Leave logging to logconfig so uvicorn's records come out in the same format
+                log_config=None,
+            )
+        finally:
+            if coordinator is not None:
+                coordinator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+import features
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# (component, phase) -> seconds; phases are "import", "mount" and "init"
+_timings: Dict[Tuple[str, str], float] = {}
+_started = time.perf_counter()
+
+
+@contextmanager
+def timed(component: str, phase: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _timings[(component, phase)] = _timings.get((component, phase), 0.0) + time.perf_counter() - start
+
+
+def report() -> Dict[str, Dict[str, float]]:
+    """Milliseconds spent per component and phase, in the order they ran.
+
+    Import times are inclusive, so a library shared by several routers is
+    charged to the first one that imports it.
+    """
+    out: Dict[str, Dict[str, float]] = {}
+    for (component, phase), seconds in _timings.items():
+        out.setdefault(component, {})[phase] = round(seconds * 1000, 1)
+    return out
+
+
+def log_report():
+    """Log the timings and any disabled features once the app is ready to serve."""
+    total_ms = round((time.perf_counter() - _started) * 1000, 1)
+    logger.info("startup complete", extra={"startup_ms": total_ms, "components": report()})
+    for name, missing in features.status().items():
+        if missing is not None:
+            logger.warning("feature disabled", extra={"feature": name, "missing": missing})
+
+
+metrics.register_gauge(
+    "startup_duration_seconds", "Time spent importing, mounting and initialising each component at startup.",
+    lambda: [({"component": component, "phase": phase}, seconds) for (component, phase), seconds in _timings.items()],
+)